@@ -0,0 +1,192 @@
+from pathlib import Path
+from typing import List
+import random
+import yaml  # type: ignore
+
+# Flags of the generated profiles, cycled through
+PROFILE_FLAGS = [
+    ('debug', ['-O0', '-g']),
+    ('release', ['-O2']),
+    ('relwithdebinfo', ['-O2', '-g']),
+    ('size', ['-Os']),
+]
+
+
+class ProjectGenerator(object):
+    # ========================================= #
+    # Generates a synthetic C/C++ project in    #
+    # the `build.default.yaml` layout           #
+    # ========================================= #
+    def __init__(self, root: Path, tus: int = 50, fan_in: int = 5, depth: int = 3, deps: int = 2,
+                 profiles: int = 2, language: str = 'c', compiler: str = 'gcc', seed: int = 0):
+        self.root = root
+        self.tus = tus
+        self.fan_in = fan_in
+        self.depth = max(1, depth)
+        self.deps = deps
+        self.profiles = max(1, profiles)
+        self.language = language
+        self.compiler = compiler
+
+        # Same parameters always generate the same project
+        self.random = random.Random(seed)
+
+        self.ext = 'c' if language == 'c' else 'cpp'
+
+        # Headers per level of the include tree, level 0
+        # is included by TUs, the last level by nothing
+        self.headers_per_level = max(1, fan_in)
+
+    # Name of a project header           #
+    # ---------------------------------- #
+    def header_name(self, level: int, index: int) -> str:
+        return f'h_{level}_{index}.h'
+
+    # Write a file, creating its parent directories           #
+    # ------------------------------------------------------- #
+    def write(self, path: Path, text: str):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+    # Headers form a tree of `depth` levels, every header           #
+    # includes one header of the next level and a vendor header     #
+    # ------------------------------------------------------------- #
+    def generate_headers(self):
+        for level in range(self.depth):
+            for index in range(self.headers_per_level):
+                name = self.header_name(level, index)
+                guard = name.replace('.', '_').upper()
+
+                lines = [f'#ifndef {guard}', f'#define {guard}', '']
+
+                if level + 1 < self.depth:
+                    child = self.random.randrange(self.headers_per_level)
+                    lines.append(f'#include "{self.header_name(level + 1, child)}"')
+
+                if self.deps:
+                    lines.append(f'#include "dep{self.random.randrange(self.deps)}.h"')
+
+                lines += [
+                    '',
+                    f'typedef struct s_{level}_{index} {{ int a; float b[8]; }} s_{level}_{index};',
+                    f'static inline int f_{level}_{index}(int x) {{ return x * {index + 1} + {level}; }}',
+                    '',
+                    f'#endif /* {guard} */',
+                    '',
+                ]
+
+                self.write(self.root / 'include' / name, '\n'.join(lines))
+
+    # Vendor dependencies are header-only           #
+    # --------------------------------------------- #
+    def generate_deps(self):
+        for index in range(self.deps):
+            guard = f'DEP{index}_H'
+            text = '\n'.join([
+                f'#ifndef {guard}',
+                f'#define {guard}',
+                f'#define DEP{index}_VERSION {index}',
+                f'static inline int dep{index}_call(int x) {{ return x + DEP{index}_VERSION; }}',
+                f'#endif /* {guard} */',
+                '',
+            ])
+
+            self.write(self.root / 'vendor' / f'dep{index}' / 'include' / f'dep{index}.h', text)
+
+    # Each TU includes `fan_in` headers of the first level           #
+    # -------------------------------------------------------------- #
+    def generate_sources(self) -> List[str]:
+        sources = []
+
+        for index in range(self.tus):
+            count = min(self.fan_in, self.headers_per_level)
+            headers = self.random.sample(range(self.headers_per_level), count)
+
+            lines = [f'#include "{self.header_name(0, header)}"' for header in headers]
+            lines.append('')
+
+            # A handful of functions with some work for the optimizer
+            for func in range(8):
+                lines += [
+                    f'int tu{index}_fn{func}(int n) {{',
+                    '    int acc = 0;',
+                    '    for (int i = 0; i < n; ++i) {',
+                    f'        acc += (i * {func + 1}) ^ (acc >> 3);',
+                    '    }',
+                    '    return acc;',
+                    '}',
+                    '',
+                ]
+
+            # The first TU holds the entry point
+            if index == 0:
+                lines += ['int main(void) {', '    return tu0_fn0(1) - 1;', '}', '']
+
+            name = f'tu{index}.{self.ext}'
+            self.write(self.root / 'src' / name, '\n'.join(lines))
+            sources.append(name)
+
+        return sources
+
+    # Write the project config           #
+    # ---------------------------------- #
+    def generate_config(self, sources: List[str]):
+        std = '-std=c11' if self.language == 'c' else '-std=c++17'
+
+        profiles = dict()
+        for index in range(self.profiles):
+            (name, flags) = PROFILE_FLAGS[index % len(PROFILE_FLAGS)]
+            if index >= len(PROFILE_FLAGS):
+                name = f'{name}{index}'
+
+            profiles[name] = flags + [std]
+
+        dependencies = dict()
+        for index in range(self.deps):
+            dependencies[f'dep{index}'] = {
+                'enabled': True,
+                'header_only': True,
+                'system_wide': False,
+                'paths': {'include': 'include', 'lib': 'lib'},
+                'libs': [],
+                'args': [],
+            }
+
+        config = {
+            'project': {
+                'name': 'bench',
+                'authors': ['py-bench'],
+                'version': '0.1.0',
+                'language': self.language,
+                'dirs': {
+                    'target': 'target',
+                    'build': 'build',
+                    'include': 'include',
+                    'source': 'src',
+                    'deps': 'vendor',
+                },
+                'setup': {
+                    'files': {'sources': sources, 'include': []},
+                    'type': 'exe',
+                    'compiler': self.compiler,
+                    'profiles': profiles,
+
+                    # Benchmarks measure real compiles
+                    'cache': {'enabled': False},
+                },
+            },
+            'dependencies': dependencies,
+        }
+
+        with open(self.root / 'build.yaml', 'w') as file:
+            yaml.safe_dump(config, file, sort_keys=False)
+
+    # Generate the whole project, returns the config path           #
+    # ------------------------------------------------------------- #
+    def generate(self) -> Path:
+        self.generate_deps()
+        self.generate_headers()
+        sources = self.generate_sources()
+        self.generate_config(sources)
+
+        return self.root / 'build.yaml'
@@ -0,0 +1,184 @@
+from config.builder import Builder
+from utils.trace import tracer
+from pathlib import Path
+from statistics import median
+from typing import Callable, Dict, List
+import os
+import platform
+import shlex
+import shutil
+import subprocess as sp
+import sys
+import time
+
+
+class BenchmarkRunner(object):
+    # ========================================= #
+    # Runs build scenarios against a generated  #
+    # project and collects timings              #
+    # ========================================= #
+    def __init__(self, config_path: Path, jobs: int, repeat: int = 3):
+        self.config_path = config_path
+        self.root = config_path.parent
+        self.jobs = jobs
+        self.repeat = max(1, repeat)
+
+        # Scenario name -> list of samples, one per repetition
+        self.samples: Dict[str, List[dict]] = dict()
+
+    # Create a builder for the first profile           #
+    # ------------------------------------------------ #
+    def load_builder(self) -> Builder:
+        builder = Builder(self.config_path)
+        builder.set_active_profile(list(builder.profiles)[0])
+        builder.set_jobs(self.jobs)
+
+        return builder
+
+    # Time a single build and split the time into            #
+    # compiler/linker time and py-build's own overhead       #
+    # ------------------------------------------------------ #
+    def measure_build(self, builder: Builder) -> dict:
+        tracer.reset()
+        builder.prepare_build_dirs()
+
+        start = time.perf_counter()
+        builder.build()
+        wall = time.perf_counter() - start
+
+        compiles = tracer.get_events('compile')
+        links = tracer.get_events('link')
+
+        # The busiest worker approximates the time spent
+        # waiting for compilers, the rest is tool overhead
+        busy = dict()
+        for event in compiles:
+            busy[event['tid']] = busy.get(event['tid'], 0.0) + event['dur'] / 1e6
+
+        compile_time = max(busy.values(), default=0.0)
+        link_time = sum(event['dur'] for event in links) / 1e6
+
+        return {
+            'wall': wall,
+            'compiled': len(compiles),
+            'compile_wall_sum': sum(event['dur'] for event in compiles) / 1e6,
+            'compile_cpu_sum': sum(event['args'].get('cpu', 0.0) for event in compiles),
+            'compile_critical': compile_time,
+            'link': link_time,
+            'overhead': max(0.0, wall - compile_time - link_time),
+        }
+
+    # Run a scenario `repeat` times           #
+    # --------------------------------------- #
+    def run_scenario(self, name: str, func: Callable[[], dict]):
+        # Builder logs are silenced while benchmarking
+        print(f'Running scenario \"{name}\"...', file=sys.stderr)
+
+        self.samples[name] = [func() for _ in range(self.repeat)]
+
+    # Remove all build outputs           #
+    # ---------------------------------- #
+    def clean(self):
+        shutil.rmtree(self.root / 'build', ignore_errors=True)
+        shutil.rmtree(self.root / 'target', ignore_errors=True)
+
+    # Scenarios           #
+    # ------------------- #
+    def config_load_cold(self) -> dict:
+        self.clean()
+
+        start = time.perf_counter()
+        self.load_builder()
+
+        return {'wall': time.perf_counter() - start}
+
+    def config_load_warm(self) -> dict:
+        # Make sure the snapshot exists
+        self.load_builder().prepare_build_dirs()
+
+        start = time.perf_counter()
+        self.load_builder()
+
+        return {'wall': time.perf_counter() - start}
+
+    def full_build(self) -> dict:
+        self.clean()
+
+        return self.measure_build(self.load_builder())
+
+    def noop_build(self) -> dict:
+        builder = self.load_builder()
+        builder.prepare_build_dirs()
+        builder.build()
+
+        return self.measure_build(builder)
+
+    def header_touch_build(self) -> dict:
+        builder = self.load_builder()
+        builder.prepare_build_dirs()
+        builder.build()
+
+        # The deepest header is included (transitively)
+        # by every TU reaching the bottom of the tree.
+        # Only touching it is no change at all
+        headers = sorted((self.root / 'include').glob('h_*.h'))
+        with open(headers[-1], 'a') as file:
+            file.write(f'/* {time.time_ns()} */\n')
+
+        return self.measure_build(builder)
+
+    def link_only_build(self) -> dict:
+        builder = self.load_builder()
+        builder.prepare_build_dirs()
+        builder.build()
+
+        for path in (self.root / 'target').rglob('bench*'):
+            path.unlink()
+
+        return self.measure_build(builder)
+
+    # Run every scenario           #
+    # ---------------------------- #
+    def run(self):
+        self.run_scenario('config_load_cold', self.config_load_cold)
+        self.run_scenario('config_load_warm', self.config_load_warm)
+        self.run_scenario('full_build', self.full_build)
+        self.run_scenario('noop_build', self.noop_build)
+        self.run_scenario('header_touch_build', self.header_touch_build)
+        self.run_scenario('link_only_build', self.link_only_build)
+
+    # Median of every metric per scenario           #
+    # --------------------------------------------- #
+    def get_results(self) -> dict:
+        results = dict()
+
+        for (name, samples) in self.samples.items():
+            results[name] = {
+                metric: median(sample[metric] for sample in samples)
+                for metric in samples[0]
+            }
+
+        return results
+
+    # Environment the numbers were taken in           #
+    # ----------------------------------------------- #
+    def get_metadata(self, compiler: str) -> dict:
+        def run(cmd: list) -> str:
+            try:
+                process = sp.run(cmd, capture_output=True, cwd=Path(__file__).parent)
+                return process.stdout.decode('utf-8', 'replace').strip()
+            except OSError:
+                return ''
+
+        version = run(shlex.split(compiler) + ['--version'])
+
+        return {
+            'commit': run(['git', 'rev-parse', 'HEAD']),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'jobs': self.jobs,
+            'repeat': self.repeat,
+            'compiler': version.split('\n')[0],
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
@@ -1,10 +1,49 @@
-from utils.file import delete_dir, get_file_list
+from utils.depfile import parse_depfile
+from utils.file import delete_dir, format_size, load_json, parse_size, write_atomic
+from utils.jobs import AdmissionQueue, JobLimiter, MemoryBudget, get_available_memory
 from utils.logger import log
-from .config import Config
+from utils.process import ProcessResult, ProcessSet, run_process
+from utils.statcache import StatCache
+from utils.trace import tracer
+from .cache import ObjectCache
+from .config import Config, SOURCE_EXTENSIONS
+from .history import CompileHistory, predict_makespan
+from .manifest import BuildManifest
+from .probe import DependencyProbe, LinkerProbe
+from .unity import UnityBuild
+from fnmatch import fnmatchcase
 from hashlib import md5
 from pathlib import Path
+from typing import List, Optional, Tuple
+import copy
+import json
+import os
 import shlex
+import shutil
 import subprocess as sp
+import sys
+import threading
+import time
+
+
+# Share of the available memory compiles may take up
+DEFAULT_MEMORY_BUDGET = '75%'
+
+# Linkers tried by `linker: auto`, fastest first,
+# with the programs the compiler driver would run
+LINKERS = [
+    ('mold', ('mold', 'ld.mold')),
+    ('lld', ('ld.lld',)),
+    ('gold', ('ld.gold',)),
+]
+
+# Flags enabling multithreaded linking, also
+# the linkers understanding `--gdb-index`
+LINKER_THREAD_FLAGS = {
+    'mold': '-Wl,--thread-count={threads}',
+    'lld': '-Wl,--threads={threads}',
+    'gold': '-Wl,--threads,--thread-count={threads}',
+}
 
 
 class Builder(Config):
@@ -16,6 +55,160 @@ class Builder(Config):
     def __init__(self, path: Path):
         super().__init__(path)
 
+        # Maximum number of compiler processes
+        # running at the same time
+        self.jobs = os.cpu_count() or 1
+
+        # Job slots shared by every process spawned, also by
+        # builders of other profiles (see `for_profile`). Builds
+        # swap in the jobserver of the process, see `set_limiter`
+        self.limiter = JobLimiter(self.jobs)
+
+        # Keep compiling the other files after a failure,
+        # instead of killing running compilers
+        self.keep_going = False
+
+        # Log predicted and actual compile times of the schedule
+        self.explain_schedule = False
+
+        # Compiles only start while their predicted peak memory
+        # fits, shared with builders of other profiles
+        budget = self.get_value_or('project:setup:memory_budget', DEFAULT_MEMORY_BUDGET)
+        try:
+            self.memory = MemoryBudget(self.parse_memory_budget(budget))
+        except ValueError:
+            log.error(f'Invalid memory budget \"{budget}\" in config, not limiting compiles by memory')
+            self.memory = MemoryBudget(None)
+
+        # Compiler processes of the running compile step
+        self.processes = ProcessSet()
+
+        # Compiler output is streamed live, one line at a time
+        self.output_lock = threading.Lock()
+
+        # Object files of the current source set,
+        # filled in by the compile step for linking
+        self.objects = []
+
+        # Parsed depfiles, keyed by path and
+        # invalidated by their mtime
+        self.depfiles = dict()
+
+        # Time spent building the precompiled header
+        # in the current build, zero if it was up to date
+        self.pch_time = 0.0
+
+        # Content hashes of sources, headers, objects and
+        # libraries; inputs with a newer mtime but the same
+        # contents, like after a checkout, aren't rebuilt
+        self.hashes = StatCache(self.dirs['build'] / 'hashes.cache')
+
+        # Outputs of every build, so that stale ones can
+        # be removed without a clean. Kept per config, so
+        # projects sharing the build dir don't judge each
+        # other's outputs
+        self.manifest = BuildManifest(self.get_state_path('manifest', '.json'))
+
+        # Fast linkers the compiler driver accepts
+        self.linkers = LinkerProbe(self.get_state_path('linkers', '.probe'))
+
+        # Local object cache, shared between projects
+        self.cache = self.setup_cache()
+
+        # Remote workers for distributed compiles
+        self.remote = self.setup_remote()
+
+        # Compiler identity used in cache keys,
+        # resolved lazily by the first worker
+        self.compiler_id = None
+        self.compiler_id_lock = threading.Lock()
+
+    # Sets the size of the compile worker pool           #
+    # -------------------------------------------------- #
+    def set_jobs(self, jobs: int):
+        if jobs < 1:
+            log.warning(f'Invalid job count \"{jobs}\", using 1')
+            jobs = 1
+
+        self.jobs = jobs
+        self.limiter = JobLimiter(jobs)
+
+    # Share the job slots of `limiter`, like the one jobserver           #
+    # of the process, shared with a parent make or nested tools          #
+    # ------------------------------------------------------------------ #
+    def set_limiter(self, limiter: JobLimiter):
+        self.jobs = limiter.jobs
+        self.limiter = limiter
+
+    # Turn a memory budget like '75%' of the available           #
+    # memory or '16G' into bytes, 'off' disables it              #
+    # ---------------------------------------------------------- #
+    def parse_memory_budget(self, value) -> Optional[int]:
+        # YAML reads an unquoted `off` as False
+        if value is None or value is False:
+            return None
+
+        text = str(value).strip()
+
+        if text.lower() in ('off', 'none', 'false', '0'):
+            return None
+
+        if text.endswith('%'):
+            available = get_available_memory()
+            if available is None:
+                return None
+
+            return int(available * float(text[:-1]) / 100)
+
+        return parse_size(text)
+
+    # Sets the memory budget of compile jobs           #
+    # ------------------------------------------------ #
+    def set_memory_budget(self, value: str):
+        self.memory = MemoryBudget(self.parse_memory_budget(value))
+
+    # Create a builder for another profile           #
+    # sharing the loaded config, the object cache    #
+    # and the job slots with this one                #
+    # ---------------------------------------------- #
+    def for_profile(self, target: str) -> 'Builder':
+        builder = copy.copy(self)
+        builder.set_active_profile(target)
+        builder.objects = []
+
+        return builder
+
+    # Create the object cache from `project:setup:cache`            #
+    # ------------------------------------------------------------- #
+    def setup_cache(self) -> Optional[ObjectCache]:
+        if not self.get_value_or('project:setup:cache:enabled', True):
+            return None
+
+        # Defaults to a per-user cache directory
+        default_dir = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'py-build'
+        cache_dir = Path(self.get_value_or('project:setup:cache:dir', default_dir)).expanduser()
+
+        if not cache_dir.is_absolute():
+            cache_dir = self.root / cache_dir
+
+        max_size = parse_size(self.get_value_or('project:setup:cache:max_size', '5G'))
+
+        return ObjectCache(cache_dir, max_size)
+
+    # Connect to the workers of `project:setup:distributed`           #
+    # --------------------------------------------------------------- #
+    def setup_remote(self):
+        hosts = self.get_value_or('project:setup:distributed:hosts', [])
+        if not hosts or not self.get_value_or('project:setup:distributed:enabled', True):
+            return None
+
+        from remote.pool import WorkerPool
+
+        timeout = float(self.get_value_or('project:setup:distributed:timeout', 120))
+        retry_delay = float(self.get_value_or('project:setup:distributed:retry_delay', 30))
+
+        return WorkerPool(list(hosts), timeout, retry_delay)
+
     # Create target and build directories           #
     # --------------------------------------------- #
     def prepare_build_dirs(self):
@@ -24,6 +217,13 @@ def prepare_build_dirs(self):
         if not self.dirs['build'].exists():
             self.dirs['build'].mkdir()
 
+        # Objects of the active profile and flag set
+        if self.active_profile:
+            obj_dir = self.get_object_dir()
+            obj_dir.mkdir(parents=True, exist_ok=True)
+
+            self.manifest.add(obj_dir, 'dir', self.active_profile)
+
         for path in self.dirs['target']:
             if not path.exists():
                 path.mkdir(parents=True)
@@ -32,116 +232,1353 @@ def prepare_build_dirs(self):
     # ------------------------------------------- #
     def clean_up(self):
         for path in self.cleanup_dirs:
-            delete_dir(path)
+            # Target dirs come as a list, one per profile
+            for entry in (path if isinstance(path, list) else [path]):
+                delete_dir(entry)
+
+    # Compile flags of the active profile           #
+    # plus position independent code if needed      #
+    # --------------------------------------------- #
+    def get_build_flags(self) -> List[str]:
+        flags = list(self.build_flags[self.active_profile])
+
+        # Shared libraries need PIC, static ones
+        # only if they end up in a shared object.
+        # Targets share their objects, one shared library
+        # target makes all of them PIC
+        types = [target['type'] for target in self.targets.values()] + [self.build_type]
+        is_pic = self.get_profile_option('pic', 'dll' in types and os.name != 'nt')
+        if is_pic and '-fPIC' not in flags:
+            flags.append('-fPIC')
+
+        # Debug info goes to '.dwo' files next to the objects,
+        # the linker only has to deal with what's left
+        if self.get_profile_option('split_dwarf', False) and '-gsplit-dwarf' not in flags:
+            flags.append('-gsplit-dwarf')
+
+        return flags
+
+    # Pick a linker from the `linker` profile option           #
+    # 'auto' takes the fastest one installed and accepted      #
+    # by the compiler, 'default' leaves the choice to it       #
+    # -------------------------------------------------------- #
+    def get_linker(self) -> str:
+        linker = self.get_profile_option('linker', 'default')
+
+        if linker != 'auto':
+            return linker
+
+        compiler = shlex.split(self.compiler)
+        for (name, programs) in LINKERS:
+            if not any(shutil.which(program) for program in programs):
+                continue
+
+            if self.linkers.is_supported(compiler, name, programs):
+                return name
+
+        return 'default'
+
+    # Driver flags selecting the linker and its threading           #
+    # returns them with a description for the timing report         #
+    # ------------------------------------------------------------- #
+    def get_linker_flags(self) -> Tuple[List[str], str]:
+        linker = self.get_linker()
+
+        flags = []
+        if linker != 'default':
+            flags.append(f'-fuse-ld={linker}')
+
+        # Linking runs once all compiles are done, so it can
+        # have the whole machine. Not tied to `jobs`, a different
+        # `-j` mustn't change the command line and force a relink
+        threads = self.get_profile_option('linker_threads', True)
+        if threads is True:
+            threads = os.cpu_count() or 1
+
+        description = linker
+        if threads and linker in LINKER_THREAD_FLAGS:
+            flags.append(LINKER_THREAD_FLAGS[linker].format(threads=int(threads)))
+            description += f' threads={int(threads)}'
+
+        if self.get_profile_option('split_dwarf', False):
+            description += ' split-dwarf'
+
+            # The index saves the debugger from reading every '.dwo'
+            if linker in LINKER_THREAD_FLAGS:
+                flags.append('-Wl,--gdb-index')
+                description += ' gdb-index'
+
+        return (flags, description)
+
+    # Object directory of the active profile           #
+    # partitioned further by a hash of the flag set    #
+    # so profiles never overwrite each other           #
+    # ------------------------------------------------ #
+    def get_object_dir(self) -> Path:
+        target = self.active_profile
+
+        flag_set = '\0'.join([self.compiler] + self.get_build_flags())
+        flag_hash = md5(flag_set.encode('utf-8')).hexdigest()[:8]
+
+        return self.dirs['build'] / target / flag_hash
+
+    # Create a unique object file path for a source file            #
+    # ------------------------------------------------------------- #
+    def get_object_path(self, source: Path) -> Path:
+        src = source.name
+
+        # Create a hash based on the directory
+        # This prevents name collisions with other
+        # generated object files, having the same name
+        src_hash = str(source).encode('utf-8')
+        src_hash_trunc = md5(src_hash).hexdigest()[:8]
+
+        # Create a destination path for object files
+        obj_path = f"{src.split('.')[0]}-{src_hash_trunc}.o"
+
+        return self.get_object_dir() / obj_path
+
+    # Build the full compiler command line for a source file             #
+    # The compiler also emits a depfile next to the object file          #
+    # ------------------------------------------------------------------ #
+    def get_compile_command(self, source: Path, obj: Path) -> List[str]:
+        dep = obj.with_suffix('.d')
+
+        # Compile vars
+        compiler = self.compiler
+        includes = ' '.join(self.include_dirs)
+        build_flags = ' '.join(self.get_build_flags())
+
+        # Build the command and split it
+        cmd_build_obj = f"{compiler} -c -o \"{obj}\" \"{source}\" -MMD -MF \"{dep}\" {includes} {build_flags}"
+
+        # Force-include the precompiled header stub, the compiler
+        # picks up the compiled header lying next to it
+        pch = self.get_pch_paths()
+        if pch is not None:
+            cmd_build_obj += f" -include \"{pch[1]}\""
+
+        return shlex.split(cmd_build_obj)
+
+    # Paths of the precompiled header, its stub and the           #
+    # compiled header for the active profile and flag set         #
+    # ----------------------------------------------------------- #
+    def get_pch_paths(self) -> Optional[Tuple[Path, Path, Path]]:
+        header = self.get_value_or('project:setup:precompiled_header', None)
+        if not header:
+            return None
+
+        # Relative to `dirs:include`
+        header = Path(header)
+        if not header.is_absolute():
+            header = self.dirs['include'] / header
+
+        stub = self.get_object_dir() / 'pch' / header.name
+
+        # GCC looks for '.gch', clang for '.pch'
+        compiler_name = Path(shlex.split(self.compiler)[0]).name
+        suffix = '.pch' if 'clang' in compiler_name else '.gch'
+
+        return (header, stub, stub.with_name(stub.name + suffix))
+
+    # Build the precompiled header if it's out of date           #
+    # ---------------------------------------------------------- #
+    def build_pch(self) -> bool:
+        self.pch_time = 0.0
+
+        pch = self.get_pch_paths()
+        if pch is None:
+            return True
+
+        (header, stub, compiled) = pch
+        target = self.active_profile
+
+        if not header.exists():
+            log.error('Precompiled header not found', path=str(header))
+            return False
+
+        # The stub only includes the real header, rewriting
+        # it would bump its mtime and force a rebuild
+        stub.parent.mkdir(parents=True, exist_ok=True)
+        text = f'#include "{header.as_posix()}"\n'
+        if not stub.exists() or stub.read_text() != text:
+            stub.write_text(text)
+
+        # Same flags as every TU, otherwise the compiler rejects it
+        dep = compiled.with_suffix('.d')
+        language = 'c-header' if self.language == 'c' else 'c++-header'
+        includes = ' '.join(self.include_dirs)
+        build_flags = ' '.join(self.get_build_flags())
+
+        cmd_build_pch = f"{self.compiler} -x {language} -o \"{compiled}\" \"{stub}\" -MMD -MF \"{dep}\" {includes} {build_flags}"
+        cmd_build_pch = shlex.split(cmd_build_pch)
+
+        if not self.needs_rebuild(stub, compiled, cmd_build_pch):
+            return True
+
+        log.info(f'\"{target}\" building precompiled header', path=str(header))
+
+        cmd_file = compiled.with_suffix('.cmd')
+        if cmd_file.exists():
+            cmd_file.unlink()
+
+        with self.limiter.slot(), tracer.span(compiled.name, 'pch', profile=target) as stats:
+            process = run_process(cmd_build_pch, self.limiter.get_pass_fds())
+
+            stats.update(wall=process.wall, cpu=process.cpu, max_rss=process.max_rss)
+
+        self.pch_time = process.wall
+
+        if process.returncode != 0:
+            log.error(f'\"{target}\" precompiled header failed')
+            log.error(f"\n{process.stderr.decode('utf-8')}")
+            return False
+
+        cmd_file.write_text(shlex.join(cmd_build_pch))
+        self.save_input_hashes(stub, compiled)
+
+        # Time spent parsing the headers, used
+        # to estimate what the PCH saves per TU
+        compiled.with_suffix('.time').write_text(f'{process.wall}')
+
+        return True
+
+    # Estimate the time saved by the precompiled header           #
+    # ----------------------------------------------------------- #
+    def report_pch_savings(self, compiled_count: int):
+        pch = self.get_pch_paths()
+        if pch is None or compiled_count == 0:
+            return
+
+        try:
+            parse_time = float(pch[2].with_suffix('.time').read_text())
+        except (OSError, ValueError):
+            return
+
+        # Each TU would have parsed the headers on its own,
+        # minus the one-time cost of building the PCH this run.
+        # Profiles building side by side each have their own
+        saved = parse_time * compiled_count - self.pch_time
+
+        log.info('Precompiled header', estimated_saving=f'{saved:.3f}s', per_tu=f'{parse_time:.3f}s', tus=compiled_count)
+
+    # Read the headers listed in a depfile          #
+    # reusing the parsed result while unchanged     #
+    # --------------------------------------------- #
+    def get_dependencies(self, dep: Path) -> List[Path]:
+        mtime = dep.stat().st_mtime_ns
+
+        cached = self.depfiles.get(dep)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        deps = parse_depfile(dep)
+        self.depfiles[dep] = (mtime, deps)
+
+        return deps
+
+    # Checks whether an object file has to be rebuilt           #
+    # by comparing it against the source, all headers           #
+    # from its depfile and the recorded command line            #
+    # --------------------------------------------------------- #
+    def needs_rebuild(self, source: Path, obj: Path, cmd: List[str], implicit: List[Path] = None) -> bool:
+        dep = obj.with_suffix('.d')
+        cmd_file = obj.with_suffix('.cmd')
+
+        try:
+            obj_mtime = obj.stat().st_mtime_ns
+
+            # Changed flags, includes or compiler force a rebuild
+            if cmd_file.read_text() != shlex.join(cmd):
+                return True
+
+            inputs = [source] + self.get_dependencies(dep) + (implicit or [])
+        except OSError:
+            # Missing object, depfile or command record
+            return True
+
+        newer = []
+        for path in inputs:
+            try:
+                if path.stat().st_mtime_ns > obj_mtime:
+                    newer.append(path)
+            except OSError:
+                # A header got removed or renamed
+                return True
+
+        # Touched, but maybe not changed
+        return bool(newer) and not self.hashes.is_unchanged(obj.with_suffix('.hash'), newer)
+
+    # Record the content hashes of the inputs of an object           #
+    # -------------------------------------------------------------- #
+    def save_input_hashes(self, source: Path, obj: Path, implicit: List[Path] = None):
+        try:
+            inputs = [source] + self.get_dependencies(obj.with_suffix('.d')) + (implicit or [])
+        except OSError:
+            return
+
+        self.hashes.save_record(obj.with_suffix('.hash'), inputs)
+
+    # Identify the compiler by its resolved path,           #
+    # binary size/mtime and `--version` output              #
+    # ----------------------------------------------------- #
+    def get_compiler_id(self) -> bytes:
+        with self.compiler_id_lock:
+            if self.compiler_id is None:
+                compiler = shlex.split(self.compiler)
+                compiler_path = shutil.which(compiler[0]) or compiler[0]
+
+                identity = [compiler_path]
+                try:
+                    stat = os.stat(compiler_path)
+                    identity.append(f'{stat.st_size}:{stat.st_mtime_ns}')
+                except OSError:
+                    pass
+
+                version = sp.run(compiler + ['--version'], capture_output=True)
+                identity.append(version.stdout.decode('utf-8', 'replace'))
+
+                self.compiler_id = '\n'.join(identity).encode('utf-8')
+
+            return self.compiler_id
+
+    # Preprocess the source of a compile command, returning          #
+    # the flags affecting the object and the preprocessed source     #
+    # `None` if the source doesn't preprocess, the real compile      #
+    # reports why                                                    #
+    # -------------------------------------------------------------- #
+    def preprocess(self, obj: Path, cmd: List[str]) -> Optional[Tuple[List[str], bytes]]:
+        # Turn the compile command into a preprocess command
+        # writing to stdout; the depfile is still generated
+        cmd_preprocess = []
+        flags = []
+
+        args = iter(cmd)
+        for arg in args:
+            if arg == '-c':
+                continue
+            elif arg == '-o':
+                next(args, None)
+                continue
+            elif arg == '-MF':
+                # Depfile location doesn't affect the object
+                cmd_preprocess += [arg, next(args, '')]
+                continue
+
+            cmd_preprocess.append(arg)
+            flags.append(arg)
+
+        cmd_preprocess += ['-E', '-MT', str(obj)]
+
+        process = sp.run(cmd_preprocess, capture_output=True)
+        if process.returncode != 0:
+            return None
+
+        return (flags, process.stdout)
+
+    # Compute the object cache key of a preprocessed source           #
+    # --------------------------------------------------------------- #
+    def get_cache_key(self, flags: List[str], preprocessed: bytes) -> str:
+        flags = '\0'.join(flags).encode('utf-8')
+
+        return ObjectCache.make_key(self.get_compiler_id(), flags, preprocessed)
+
+    # Compile a single source file into an obj file           #
+    # Runs inside a worker thread, so no logging here         #
+    # Returns `None` if the compile step got cancelled        #
+    # ------------------------------------------------------- #
+    def compile_source_file(self, source: Path) -> Optional[ProcessResult]:
+        with self.limiter.slot():
+            # Nothing new starts once a file failed
+            if self.processes.is_cancelled:
+                return None
+
+            with tracer.span(source.name, 'compile', file=str(source), profile=self.active_profile) as stats:
+                process = self.run_compile(source)
+
+                stats.update(wall=process.wall, cpu=process.cpu, max_rss=process.max_rss)
+
+        # Fail fast: kill the compilers still running
+        if process.returncode != 0 and not self.keep_going:
+            self.processes.cancel()
+
+        return process
+
+    # Worker loop compiling files from the admission queue           #
+    # results are handed over through per-file futures               #
+    # -------------------------------------------------------------- #
+    def compile_queue(self, queue: AdmissionQueue, futures: dict):
+        while True:
+            source = queue.take()
+            if source is None:
+                return
+
+            try:
+                futures[source].set_result(self.compile_source_file(source))
+            except BaseException as err:
+                futures[source].set_exception(err)
+            finally:
+                queue.done(source)
+
+    # Print a line of compiler output as it arrives           #
+    # prefixed with the profile and file it belongs to        #
+    # ------------------------------------------------------- #
+    def stream_line(self, source: Path, line: bytes):
+        text = line.decode('utf-8', 'replace').rstrip('\n')
+
+        with self.output_lock:
+            sys.stderr.write(f'[{self.active_profile} {source.name}] {text}\n')
+            sys.stderr.flush()
+
+    # Compile through the object cache or on a remote          #
+    # worker if possible, otherwise locally                    #
+    # -------------------------------------------------------- #
+    def run_compile(self, source: Path) -> ProcessResult:
+        obj = self.get_object_path(source)
+        cmd = self.get_compile_command(source, obj)
+
+        # Forget the previous command line until this compile succeeds
+        cmd_file = obj.with_suffix('.cmd')
+        if cmd_file.exists():
+            cmd_file.unlink()
+
+        # The compiled header doesn't show up in depfiles
+        pch = self.get_pch_paths()
+        implicit = [pch[2]] if pch is not None else []
+
+        # Both the cache and workers need the preprocessed source,
+        # which also writes the depfile. Neither knows about the
+        # '.dwo' files of split debug info, so those compile locally
+        preprocessed = None
+        if (self.cache is not None or self.remote is not None) and '-gsplit-dwarf' not in cmd:
+            with tracer.span(f'preprocess {source.name}', 'preprocess'):
+                preprocessed = self.preprocess(obj, cmd)
+
+        # Try the object cache first
+        key = None
+        if self.cache is not None and preprocessed is not None:
+            key = self.get_cache_key(*preprocessed)
+
+        if key is not None:
+            stderr = self.cache.fetch(key, obj, self.active_profile)
+
+            if stderr is not None:
+                cmd_file.write_text(shlex.join(cmd))
+                self.save_input_hashes(source, obj, implicit)
+
+                # Replay the diagnostics of the original compile
+                return ProcessResult(cmd, 0, b'', stderr)
+
+        # Compile on a worker, or locally if none is reachable
+        process = None
+        if self.remote is not None and preprocessed is not None:
+            process = self.run_remote_compile(source, obj, cmd, *preprocessed)
+
+        if process is None:
+            process = run_process(
+                cmd, self.limiter.get_pass_fds(),
+                on_line=lambda line: self.stream_line(source, line),
+                processes=self.processes,
+            )
+
+        # Record the exact command line for the next build
+        if process.returncode == 0:
+            cmd_file.write_text(shlex.join(cmd))
+            self.save_input_hashes(source, obj, implicit)
+
+            if key is not None:
+                self.cache.store(key, obj, process.stderr)
+
+        return process
+
+    # Send a preprocessed source to a remote worker           #
+    # ------------------------------------------------------- #
+    def run_remote_compile(self, source: Path, obj: Path, cmd: List[str],
+                           flags: List[str], preprocessed: bytes) -> Optional[ProcessResult]:
+        from remote.pool import get_remote_args
+
+        # Workers resolve the compiler by name in their own $PATH
+        compiler = shlex.split(self.compiler)
+        args = get_remote_args(flags[len(compiler):], source)
+        compiler = Path(compiler[0]).name
+
+        with tracer.span(f'remote {source.name}', 'remote'):
+            return self.remote.compile(cmd, compiler, self.language, args, preprocessed, obj)
+
+    # Unity build options of the active profile            #
+    # either `unity: true` or a dictionary of options      #
+    # `None` if unity builds are disabled                  #
+    # ---------------------------------------------------- #
+    def get_unity_options(self) -> Optional[dict]:
+        unity = self.get_profile_option('unity', False)
+        if isinstance(unity, dict):
+            return unity if unity.get('enabled', True) else None
+
+        return dict() if unity else None
+
+    # Translation units to compile for the active profile           #
+    # either the sources themselves or generated unity batches      #
+    # ------------------------------------------------------------- #
+    def get_compile_units(self) -> List[Path]:
+        sources = list(self.build_files['sources'])
+
+        unity = self.get_unity_options()
+        if unity is None:
+            return sources
+
+        extensions = SOURCE_EXTENSIONS.get(self.language, SOURCE_EXTENSIONS['c'])
+
+        batcher = UnityBuild(
+            self.dirs['source'],
+            self.get_object_dir() / 'unity',
+            batch_size=int(unity.get('batch_size', 8)),
+            exclude=unity.get('exclude', []),
+            extension=extensions[0],
+        )
+
+        return batcher.generate(sources)
 
     # Compile all source files into obj files           #
     # No linking yet                                    #
+    # `ready` futures of the units get resolved as      #
+    # soon as their object is up to date or failed      #
+    # `downstream` holds the expected link time still   #
+    # ahead of each unit once it compiled               #
     # ------------------------------------------------- #
-    def compile_source_files(self) -> list:
+    def compile_source_files(self, units: List[Path] = None, ready: dict = None, downstream: dict = None) -> list:
+        from concurrent.futures import Future, ThreadPoolExecutor
+
         # Use active target profile
         target = self.active_profile
-        log.info(f'Starting \"{target}\" compile...')
+        log.info(f'Starting \"{target}\" compile...', jobs=self.jobs)
 
         # Store the results of all operations in this list
         # TODO: Find a better way to do this
         results = list()
 
-        # Gather all source files
-        for source in self.build_files['sources']:
-            src = source.name
+        # Sources or unity batches to compile
+        if units is None:
+            units = self.get_compile_units()
 
-            # Create a hash based on the directory
-            # This prevents name collisions with other
-            # generated object files, having the same name
-            src_hash = str(source).encode('utf-8')
-            src_hash_trunc = md5(src_hash).hexdigest()[:8]
+        if ready is None:
+            ready = dict()
 
-            # Create a destination path for object files
-            obj_path = f"{src.split('.')[0]}-{src_hash_trunc}.o"
-            obj = self.dirs['build'] / obj_path
+        if downstream is None:
+            downstream = dict()
 
-            # Compile vars
-            compiler = self.compiler
-            includes = ' '.join(self.include_dirs)
-            build_flags = ' '.join(self.build_flags[target])
+        # Exact list of objects the link step will use
+        self.objects = [self.get_object_path(source) for source in units]
 
-            # Build the command and split it
-            cmd_build_obj = f"{compiler} -c -o \"{obj}\" \"{source}\" {includes} {build_flags}"
+        for (source, obj) in zip(units, self.objects):
+            files = [obj.with_suffix(suffix) for suffix in ('.d', '.cmd', '.hash', '.dwo')]
+            self.manifest.add(obj, 'object', target, source, files)
 
-            cmd_build_obj = shlex.split(cmd_build_obj)
+        # Every TU depends on the precompiled header, build it
+        # first so that its new mtime marks them out of date
+        if not self.build_pch():
+            for future in ready.values():
+                future.set_result(False)
 
-            # Run and capture output
-            process = sp.run(cmd_build_obj, capture_output=True)
+            return [False]
 
-            # Check return codes
-            if process.returncode == 0:
-                log.info(f"\"{target}\" intermediate compile complete")
+        # The compiled header doesn't show up in depfiles
+        pch = self.get_pch_paths()
+        implicit = [pch[2]] if pch is not None else []
 
-                if process.stderr:
-                    log.info('Captured output: ')
-                    log.info(f"\n{process.stderr.decode('utf-8')}")
+        # Gather all out-of-date source files
+        sources = []
+        for source in units:
+            obj = self.get_object_path(source)
+            cmd = self.get_compile_command(source, obj)
 
-                results.append(True)
+            if self.needs_rebuild(source, obj, cmd, implicit):
+                sources.append(source)
             else:
-                log.error(f'\"{target}\" intermediate compile failed')
-                log.error(f"\n{process.stderr.decode('utf-8')}")
+                results.append(True)
+
+                if source in ready:
+                    ready[source].set_result(True)
+
+        if not sources:
+            log.info(f'\"{target}\" objects are up to date')
+            return results
+
+        log.info(f'\"{target}\" compiling {len(sources)} file(s)', skipped=len(results))
+        workers = max(1, min(self.jobs, len(sources)))
+
+        # Fresh for every run, a previous failure mustn't stick
+        self.processes = ProcessSet()
+        cancelled = 0
+
+        # Longest expected compiles start first, so that
+        # no big file ends up compiling alone at the end.
+        # With several targets, the links waiting on a file
+        # count too, feeding the longest link chain first
+        history = CompileHistory(self.get_object_dir() / 'durations.json')
+        estimates = {source: history.estimate(source) for source in sources}
+        schedule = sorted(sources, key=lambda source: estimates[source] + downstream.get(source, 0.0), reverse=True)
+
+        # Files whose predicted peak memory doesn't fit the
+        # budget wait, lighter files further down go first
+        memory = {source: history.estimate_rss(source) for source in sources}
+        queue = AdmissionQueue(schedule, memory, self.memory)
+
+        futures = {source: Future() for source in sources}
+        start = time.perf_counter()
 
-                results.append(False)
+        # Links waiting on an object start right away,
+        # not when its diagnostics are reported
+        for source in sources:
+            if source in ready:
+                futures[source].add_done_callback(
+                    lambda future, source=source: ready[source].set_result(self.is_compiled(future))
+                )
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in range(workers):
+                executor.submit(self.compile_queue, queue, futures)
+
+            # Diagnostics are still reported one file at a time,
+            # in config order, no matter which compiler finishes first
+            for source in sources:
+                process = futures[source].result()
+
+                # Never started or killed because another file failed
+                if process is None or (self.processes.is_cancelled and process.returncode < 0):
+                    cancelled += 1
+                    results.append(False)
+                    continue
+
+                # Check return codes
+                if process.returncode == 0:
+                    log.info(f"\"{target}\" intermediate compile complete", file=source.name)
+
+                    # Cache hits say nothing about compile times
+                    if process.wall > 0:
+                        history.record(source, process.wall, process.max_rss)
+
+                    # Output shown live doesn't need repeating,
+                    # cached and remote compiles weren't shown yet
+                    if process.stderr and not process.streamed:
+                        log.info('Captured output: ')
+                        log.info(f"\n{process.stderr.decode('utf-8')}")
+
+                    results.append(True)
+                else:
+                    # Repeated in one piece, streamed lines
+                    # of parallel compiles are interleaved
+                    log.error(f'\"{target}\" intermediate compile failed', file=source.name)
+                    log.error(f"\n{process.stderr.decode('utf-8')}")
+
+                    results.append(False)
+
+        makespan = time.perf_counter() - start
+        history.save()
+
+        if cancelled:
+            log.warning(f'\"{target}\" stopped after the first failure', cancelled=cancelled)
+
+        if self.explain_schedule:
+            self.report_schedule(sources, schedule, estimates, workers, makespan)
+
+        self.report_pch_savings(len(sources))
+
+        # Report cache usage for this run and trim the cache.
+        # Profiles building side by side share the cache,
+        # each reports its own hits and misses
+        if self.cache is not None:
+            log.info('Object cache', profile=target, **self.cache.take_profile_stats(target))
+
+            self.cache.evict()
+            self.cache.save_stats()
 
         return results
 
+    # Whether the future of a compile holds a successful compile            #
+    # --------------------------------------------------------------------- #
+    def is_compiled(self, future) -> bool:
+        if future.exception() is not None:
+            return False
+
+        process = future.result()
+
+        return process is not None and process.returncode == 0
+
+    # Log the predicted makespan of the schedule against            #
+    # config order and what the compile step actually took          #
+    # ------------------------------------------------------------- #
+    def report_schedule(self, sources: List[Path], schedule: List[Path], estimates: dict, workers: int, makespan: float):
+        target = self.active_profile
+
+        predicted = predict_makespan([estimates[source] for source in schedule], workers)
+        config_order = predict_makespan([estimates[source] for source in sources], workers)
+
+        budget = self.memory.budget
+
+        log.info(
+            f'\"{target}\" compile schedule',
+            workers=workers,
+            memory_budget=format_size(budget) if budget is not None else 'off',
+            predicted=f'{predicted:.3f}s',
+            config_order=f'{config_order:.3f}s',
+            actual=f'{makespan:.3f}s',
+        )
+
+        for source in schedule[:5]:
+            log.info('Scheduled early', file=source.name, expected=f'{estimates[source]:.3f}s')
+
+    # Checks whether the binary has to be relinked          #
+    # by comparing it against all objects, libraries        #
+    # and the recorded linker command line                  #
+    # ----------------------------------------------------- #
+    def needs_relink(self, bin_path: Path, cmd_file: Path, cmd: List[str]) -> bool:
+        try:
+            bin_mtime = bin_path.stat().st_mtime_ns
+
+            # Changed objects, flags or libraries force a relink
+            if cmd_file.read_text() != shlex.join(cmd):
+                return True
+        except OSError:
+            # Missing binary or command record
+            return True
+
+        inputs = self.get_link_inputs()
+
+        newer = []
+        for path in inputs:
+            try:
+                if path.stat().st_mtime_ns > bin_mtime:
+                    newer.append(path)
+            except OSError:
+                return True
+
+        # Recompiled objects often come out identical
+        return bool(newer) and not self.hashes.is_unchanged(cmd_file.with_suffix('.hash'), newer)
+
+    # Objects and vendor libraries going into the link           #
+    # ---------------------------------------------------------- #
+    def get_link_inputs(self) -> List[Path]:
+        return self.objects + self.deps.get_library_files(self.linker_args)
+
+    # Target directory of the active profile           #
+    # ------------------------------------------------ #
+    def get_target_dir(self) -> Path:
+        # Target dirs are pushed in profile order
+        index = list(self.profiles).index(self.active_profile)
+
+        return self.dirs['target'][index]
+
+    # Output file name based on the build type           #
+    # -------------------------------------------------- #
+    def get_output_path(self) -> Path:
+        if self.build_type == 'lib':
+            name = f'lib{self.name}.a'
+        elif self.build_type == 'dll':
+            name = f'{self.name}.dll' if os.name == 'nt' else f'lib{self.name}.so'
+        else:
+            name = f'{self.name}.{self.build_type}'
+
+        return self.get_target_dir() / name
+
     # Compile all object files into one binary           #
+    # or archive them into a static library              #
     # -------------------------------------------------- #
-    def compile_objects(self):
+    def compile_objects(self) -> bool:
         # Use active target profile
         target = self.active_profile
-        log.info(f'Starting \"{target}\" build...')
+        bin_path = self.get_output_path()
+
+        log.info(f'Starting \"{target}\" build...', output=bin_path.name)
 
-        # Glob all object files and add quotes for paths
-        objs = get_file_list(self.dirs['build'], '*.o')
-        objs = [f'\"{path}\"' for path in objs]
+        # Also forget the command record if the output is renamed
+        cmd_file = self.get_object_dir() / f'{bin_path.name}.cmd'
+        self.manifest.add(bin_path, 'output', target, files=[cmd_file, cmd_file.with_suffix('.hash')])
 
-        # Ugly hack to use the selected target as the index for
-        # the list of targets which are already stored as paths
-        # TODO: Figure out a better way to do this
-        target_path = self.root / 'target' / target
-        target_index = self.dirs['target'].index(target_path)
+        if self.build_type == 'lib':
+            return self.archive_objects(bin_path)
 
-        # Change filename extensions based on target build type
-        bin_path = self.dirs['target'][target_index] / \
-            f'{self.name}.{self.build_type}'
+        # Only link objects of the current source set,
+        # stale objects of removed sources are ignored
+        objs = [f'\"{path}\"' for path in self.objects]
 
         # Vars for final compile
         compiler = self.compiler
         objs = ' '.join(objs)
         libs = ' '.join(self.library_dirs)
         largs = ' '.join(self.linker_args)
-        build_flags = ' '.join(self.build_flags[target])
+        build_flags = ' '.join(self.get_build_flags())
+
+        # Shared libraries need the driver to know
+        if self.build_type == 'dll':
+            build_flags = f'-shared {build_flags}'
+
+        # Linker selection, threading and debug index
+        (linker_flags, linker) = self.get_linker_flags()
+        build_flags = ' '.join([build_flags] + linker_flags)
 
         # Build command and split
         cmd_build_bin = f"{compiler} -o \"{bin_path}\" {objs} {build_flags} {libs} {largs}"
         cmd_build_bin = shlex.split(cmd_build_bin)
 
+        if not self.needs_relink(bin_path, cmd_file, cmd_build_bin):
+            log.info(f'\"{target}\" binary is up to date', path=str(bin_path))
+            return True
+
+        # Forget the previous command line until this link succeeds
+        if cmd_file.exists():
+            cmd_file.unlink()
+
         # Run and capture output
-        process = sp.run(cmd_build_bin, capture_output=True)
+        with self.limiter.slot(), tracer.span(bin_path.name, 'link', file=str(bin_path), profile=target, linker=linker) as stats:
+            process = run_process(cmd_build_bin, self.limiter.get_pass_fds())
+
+            stats.update(wall=process.wall, cpu=process.cpu, max_rss=process.max_rss)
 
         # Check return codes
         if process.returncode == 0:
-            log.info(f"\"{target}\" final build complete")
+            log.info(f"\"{target}\" final build complete", output=bin_path.name, seconds=f'{process.wall:.3f}', linker=linker)
+
+            cmd_file.write_text(shlex.join(cmd_build_bin))
+            self.hashes.save_record(cmd_file.with_suffix('.hash'), self.get_link_inputs())
+            self.save_link_time(bin_path.name, linker, process.wall)
 
             if process.stderr:
                 log.info('Captured output: ')
                 log.info(f"\n{process.stderr.decode('utf-8')}")
         else:
-            log.error(f'\"{target}\" final build failed')
+            log.error(f'\"{target}\" final build failed', output=bin_path.name)
+            log.error(f"\n{process.stderr.decode('utf-8')}")
+
+        return process.returncode == 0
+
+    # Last link time of every profile, output and linker configuration           #
+    # -------------------------------------------------------------------------- #
+    def load_link_times(self) -> dict:
+        times = load_json(self.dirs['build'] / 'link-times.json')
+
+        return times if isinstance(times, dict) else dict()
+
+    # Remember the link time of an output of the active            #
+    # profile under the linker configuration it used               #
+    # ------------------------------------------------------------ #
+    def save_link_time(self, output: str, linker: str, seconds: float):
+        path = self.dirs['build'] / 'link-times.json'
+
+        # Profiles and targets link concurrently, one at a time here
+        with self.output_lock:
+            times = self.load_link_times()
+
+            # Older files kept one time per profile
+            outputs = times.get(self.active_profile)
+            if not isinstance(outputs, dict):
+                outputs = dict()
+
+            outputs = {name: linkers for name, linkers in outputs.items() if isinstance(linkers, dict)}
+            outputs.setdefault(output, dict())[linker] = round(seconds, 3)
+            times[self.active_profile] = outputs
+
+            try:
+                write_atomic(path, json.dumps(times, indent=2, sort_keys=True))
+            except OSError as err:
+                log.warning('Failed to save link times', error=str(err))
+
+    # Run the archiver and log failures           #
+    # ------------------------------------------- #
+    def run_archiver(self, args: List[str], is_quiet: bool = False) -> Optional[ProcessResult]:
+        archiver = shlex.split(self.get_value_or('project:setup:archiver', 'ar'))
+
+        with self.limiter.slot():
+            process = run_process(archiver + args, self.limiter.get_pass_fds())
+
+        if process.returncode != 0 and is_quiet:
+            return None
+        elif process.returncode != 0:
+            log.error(f'\"{self.active_profile}\" archiving failed')
             log.error(f"\n{process.stderr.decode('utf-8')}")
+            return None
+
+        return process
+
+    # Members of an archive, `None` if it can't be listed           #
+    # ------------------------------------------------------------- #
+    def list_archive(self, lib_path: Path) -> Optional[List[str]]:
+        listing = self.run_archiver(['t', str(lib_path)], is_quiet=True)
+        if listing is None:
+            return None
+
+        # Thin archives list paths, regular ones names,
+        # either may contain spaces
+        return [member for member in listing.stderr.decode('utf-8').splitlines() if member]
+
+    # Archive objects into a static library           #
+    # Only members whose objects changed are          #
+    # replaced, removed sources are deleted           #
+    # ----------------------------------------------- #
+    def archive_objects(self, lib_path: Path) -> bool:
+        target = self.active_profile
+
+        # Thin archives only reference the object files
+        is_thin = bool(self.get_profile_option('thin_archive', False))
+        mode = 'rcsT' if is_thin else 'rcs'
+
+        # The mode is recorded, switching it needs a fresh archive
+        cmd_file = self.get_object_dir() / f'{lib_path.name}.cmd'
+        try:
+            is_fresh = cmd_file.read_text() != mode or not lib_path.exists()
+        except OSError:
+            is_fresh = True
+
+        with tracer.span(lib_path.name, 'link', file=str(lib_path), profile=target) as stats:
+            members = []
+            if not is_fresh:
+                members = self.list_archive(lib_path)
+
+                # Thin archives can't be listed once a member is gone
+                if members is None:
+                    log.warning(f'\"{target}\" failed to list the library, recreating it', path=str(lib_path))
+                    (members, is_fresh) = ([], True)
+
+            if is_fresh:
+                if lib_path.exists():
+                    lib_path.unlink()
+                if cmd_file.exists():
+                    cmd_file.unlink()
+
+                changed = self.objects
+                stale = []
+            else:
+                names = {path.name for path in self.objects}
+                member_names = {Path(member).name for member in members}
+
+                stale = [member for member in members if Path(member).name not in names]
+
+                lib_mtime = lib_path.stat().st_mtime_ns
+                changed = [
+                    obj for obj in self.objects
+                    if obj.name not in member_names or obj.stat().st_mtime_ns > lib_mtime
+                ]
+
+            if not changed and not stale:
+                log.info(f'\"{target}\" library is up to date', path=str(lib_path))
+                return True
+
+            # `ar d` only matches members by name and quietly
+            # keeps the paths of thin archives, recreate those
+            if stale and is_thin:
+                lib_path.unlink()
+                changed = self.objects
+            elif stale and self.run_archiver(['d', str(lib_path)] + stale) is None:
+                return False
+
+            # Also rewrites the symbol index
+            process = self.run_archiver([mode, str(lib_path)] + [str(obj) for obj in changed])
+            if process is None:
+                return False
+
+            # Count the members that actually left the archive
+            remaining = self.list_archive(lib_path)
+            deleted = len(set(members) - set(remaining)) if remaining is not None else 0
+
+            stats.update(replaced=len(changed), deleted=deleted)
+
+        cmd_file.write_text(mode)
+
+        log.info(f'\"{target}\" library complete', output=lib_path.name, replaced=len(changed), deleted=deleted, thin=is_thin)
+
+        return True
 
     # Build source and object files           #
+    # returns whether everything built        #
     # --------------------------------------- #
-    def build(self):
-        results = self.compile_source_files()
+    def build(self) -> bool:
+        target = self.active_profile
+
+        try:
+            if self.targets:
+                return self.build_targets()
+
+            with tracer.span(f'compile {target}', 'phase'):
+                results = self.compile_source_files()
+
+            # Only perform the final compile
+            # once all object files have been built
+            if not all(res == True for res in results):
+                return False
+
+            with tracer.span(f'link {target}', 'phase'):
+                return self.compile_objects()
+        finally:
+            self.manifest.save()
+            self.hashes.save()
+            self.linkers.save()
+
+    # Create a builder linking one target of a           #
+    # multi-target project, in place of the project      #
+    # -------------------------------------------------- #
+    def for_target(self, name: str) -> 'Builder':
+        builder = copy.copy(self)
+        builder.name = self.targets[name]['name']
+        builder.build_type = self.targets[name]['type']
+        builder.objects = []
+
+        return builder
+
+    # Sources of every target, matched against the           #
+    # project sources by the target's glob patterns          #
+    # ------------------------------------------------------ #
+    def get_target_sources(self) -> dict:
+        sources = dict()
+
+        for name, target in self.targets.items():
+            matched = []
+
+            for source in self.build_files['sources']:
+                try:
+                    rel_path = source.relative_to(self.dirs['source']).as_posix()
+                except ValueError:
+                    rel_path = source.as_posix()
+
+                if any(fnmatchcase(rel_path, pattern) for pattern in target['sources']):
+                    matched.append(source)
+
+            if not matched:
+                log.warning(f'Target \"{name}\" has no sources', patterns=target['sources'])
+
+            sources[name] = matched
+
+        return sources
+
+    # Outputs of other targets a target links against           #
+    # Static libraries bring their own dependencies along,      #
+    # shared ones are already linked against theirs             #
+    # --------------------------------------------------------- #
+    def get_target_libraries(self, name: str) -> List[Path]:
+        libraries = []
+
+        for dep in self.targets[name]['depends']:
+            libraries.append(self.for_target(dep).get_output_path())
+
+            if self.targets[dep]['type'] == 'lib':
+                libraries += self.get_target_libraries(dep)
+
+        # Static libraries have to come after everything using them
+        libraries = list(dict.fromkeys(reversed(libraries)))
+        libraries.reverse()
+
+        return libraries
+
+    # Outputs of the active profile           #
+    # --------------------------------------- #
+    def get_output_paths(self) -> List[Path]:
+        if not self.targets:
+            return [self.get_output_path()]
+
+        return [self.for_target(name).get_output_path() for name in self.targets]
+
+    # Expected link time of every target plus the longest           #
+    # chain of targets linking after it, from the last              #
+    # recorded link of each output                                  #
+    # ------------------------------------------------------------- #
+    def get_link_chains(self) -> dict:
+        outputs = self.load_link_times().get(self.active_profile, dict())
+        (_, linker) = self.get_linker_flags()
+
+        # Outputs never linked with this linker
+        # take the time of any other linker
+        link_times = dict()
+        for name in self.targets:
+            linkers = outputs.get(self.for_target(name).get_output_path().name, dict())
+            link_times[name] = linkers.get(linker, max(linkers.values(), default=0.0))
+
+        chains = dict()
+
+        # Targets come in dependency order, dependents last
+        for name in reversed(list(self.targets)):
+            dependents = [other for other, target in self.targets.items() if name in target['depends']]
+            chains[name] = link_times[name] + max((chains[other] for other in dependents), default=0.0)
+
+        return chains
+
+    # Link a target once its objects and the targets           #
+    # it depends on are ready, resolving its own future        #
+    # -------------------------------------------------------- #
+    def link_target(self, name: str, sources: List[Path], ready: dict, links: dict):
+        target = self.active_profile
+
+        try:
+            is_ready = all(ready[source].result() for source in sources)
+            is_ready = is_ready and all(links[dep].result() for dep in self.targets[name]['depends'])
+
+            # Targets without sources were warned about already
+            if not sources:
+                links[name].set_result(False)
+                return
+
+            if not is_ready:
+                log.warning(f'\"{target}\" skipping target \"{name}\", its inputs failed')
+                links[name].set_result(False)
+                return
+
+            builder = self.for_target(name)
+            builder.objects = [self.get_object_path(source) for source in sources]
+
+            if builder.build_type != 'lib':
+                libraries = self.get_target_libraries(name)
+                builder.objects += libraries
+
+                # Shared libraries are found next to the binary
+                if os.name != 'nt' and any(path.suffix == '.so' for path in libraries):
+                    builder.linker_args = self.linker_args + ['-Wl,-rpath,$ORIGIN']
+
+            with tracer.span(f'link {target} {name}', 'phase'):
+                links[name].set_result(builder.compile_objects())
+        except BaseException as err:
+            links[name].set_exception(err)
+
+    # Build every target of a multi-target project           #
+    # Sources shared by targets compile only once, in one    #
+    # compile step; each target links as soon as its         #
+    # objects and the targets it depends on are done         #
+    # ------------------------------------------------------ #
+    def build_targets(self) -> bool:
+        from concurrent.futures import Future, ThreadPoolExecutor
+
+        target = self.active_profile
+
+        if self.get_unity_options() is not None:
+            log.warning(f'\"{target}\" unity builds are ignored for multi-target projects')
+
+        sources = self.get_target_sources()
+        units = list(dict.fromkeys(source for matched in sources.values() for source in matched))
+
+        ready = {source: Future() for source in units}
+        links = {name: Future() for name in self.targets}
+
+        # Sources feeding the longest chain of links go first
+        chains = self.get_link_chains()
+        downstream = dict()
+        for (name, matched) in sources.items():
+            for source in matched:
+                downstream[source] = max(downstream.get(source, 0.0), chains[name])
+
+        log.info(f'\"{target}\" building {len(self.targets)} target(s)', targets=', '.join(self.targets))
+
+        # Targets come in dependency order, and every one
+        # gets a thread, so waiting can't starve the pool
+        with ThreadPoolExecutor(max_workers=len(self.targets)) as executor:
+            for name in self.targets:
+                executor.submit(self.link_target, name, sources[name], ready, links)
+
+            try:
+                with tracer.span(f'compile {target}', 'phase'):
+                    self.compile_source_files(units, ready, downstream)
+            finally:
+                # Don't leave links waiting on an aborted compile step
+                for future in ready.values():
+                    if not future.done():
+                        future.set_result(False)
+
+            # Re-raise errors of any link
+            for future in links.values():
+                future.result()
+
+        failed = [name for name, future in links.items() if not future.result()]
+        if failed:
+            log.error(f'\"{target}\" failed to build {len(failed)} target(s)', targets=', '.join(failed))
+
+        return not failed
+
+    # Build several profiles side by side           #
+    # Each profile runs in its own thread, while    #
+    # the shared job slots keep the total number    #
+    # of compiler and linker processes at `jobs`    #
+    # Returns whether every profile built           #
+    # --------------------------------------------- #
+    def build_profiles(self, targets: List[str]) -> bool:
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Unknown profiles fall back to the default one,
+        # never build the same profile twice at once
+        builders = dict()
+        for target in targets:
+            builder = self.for_profile(target)
+            builders.setdefault(builder.active_profile, builder)
+
+        targets = list(builders)
+        builders = list(builders.values())
+
+        for builder in builders:
+            builder.prepare_build_dirs()
+
+        if len(builders) == 1:
+            return builders[0].build()
+
+        log.info(f'Building {len(builders)} profiles', profiles=', '.join(targets), jobs=self.jobs)
+
+        with ThreadPoolExecutor(max_workers=len(builders)) as executor:
+            futures = [executor.submit(builder.build) for builder in builders]
+
+            # Re-raise errors of any profile
+            results = [future.result() for future in futures]
+
+        return all(results)
+
+    # Why an output of the manifest is stale, `None`           #
+    # if the current config still produces it                  #
+    # -------------------------------------------------------- #
+    def get_stale_reason(self, output: str, entry: dict, profiles: dict, sources: set) -> Optional[str]:
+        builder = profiles.get(entry['profile'])
+        if builder is None:
+            return 'profile removed'
+
+        obj_dir = builder.get_object_dir()
+
+        if entry['kind'] == 'dir':
+            return 'flags changed' if Path(output) != obj_dir else None
+
+        if entry['kind'] == 'output':
+            return 'output renamed' if Path(output) not in builder.get_output_paths() else None
+
+        # Objects of an older flag set go with their directory
+        if Path(output).parent != obj_dir:
+            return 'flags changed'
+
+        if entry['input'] in sources:
+            return None
+
+        # Unity batches aren't sources, the generator
+        # drops those of an older layout
+        source = Path(entry['input'])
+        if source.parent == obj_dir / 'unity':
+            if builder.get_unity_options() is None:
+                return 'unity disabled'
+
+            return None if source.exists() else 'batch removed'
+
+        return 'source removed'
+
+    # Remove outputs the config no longer produces           #
+    # sources, profiles or flag sets that are gone,          #
+    # and probe results of removed dependencies              #
+    # ------------------------------------------------------ #
+    def collect_garbage(self):
+        profiles = {target: self.for_profile(target) for target in self.profiles}
+        sources = {str(source) for source in self.build_files['sources']}
+
+        (removed, freed) = (0, 0)
+        for (output, entry) in self.manifest.get_entries().items():
+            reason = self.get_stale_reason(output, entry, profiles, sources)
+            if reason is None:
+                continue
+
+            path = Path(output)
+            log.debug('Removing stale output', path=output, reason=reason)
+
+            if entry['kind'] == 'dir':
+                freed += sum(file.stat().st_size for file in path.rglob('*') if file.is_file())
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                for file in [path] + [Path(file) for file in entry['files']]:
+                    try:
+                        freed += file.stat().st_size
+                        file.unlink()
+                    except OSError:
+                        continue
+
+            # Directories of removed profiles, if nothing else is in there
+            if reason == 'profile removed':
+                try:
+                    path.parent.rmdir()
+                except OSError:
+                    pass
+
+            self.manifest.remove(output)
+            removed += 1
+
+        self.manifest.save()
+
+        # Probe results of dependencies removed from the config
+        probe = DependencyProbe(self.get_state_path('deps', '.probe'))
+        for name in [name for name in probe.entries if name not in self.deps]:
+            del probe.entries[name]
+            probe.is_dirty = True
+
+        probe.save()
+
+        log.info('Removed stale outputs', outputs=removed, freed=format_size(freed))
+
+    # Log the slowest translation units and link time           #
+    # --------------------------------------------------------- #
+    def report_timings(self, count: int):
+        compiles = tracer.get_events('compile')
+        compiles.sort(key=lambda event: event['dur'], reverse=True)
+
+        if compiles:
+            log.info(f'Slowest {min(count, len(compiles))} of {len(compiles)} translation unit(s):')
+
+        for event in compiles[:count]:
+            args = event['args']
+            log.info(
+                event['name'],
+                profile=args.get('profile', ''),
+                wall=f"{event['dur'] / 1e6:.3f}s",
+                cpu=f"{args.get('cpu', 0.0):.3f}s",
+                max_rss=format_size(args.get('max_rss', 0)),
+            )
+
+        links = tracer.get_events('link')
+        for event in links:
+            args = event['args']
+            log.info(
+                f"Link {event['name']}",
+                profile=args.get('profile', ''),
+                wall=f"{event['dur'] / 1e6:.3f}s",
+                cpu=f"{args.get('cpu', 0.0):.3f}s",
+                max_rss=format_size(args.get('max_rss', 0)),
+            )
+
+        # Compare against the last link under other linker configurations
+        times = self.load_link_times()
+        for (profile, output) in sorted({(event['args'].get('profile'), event['name']) for event in links if 'linker' in event['args']}):
+            linkers = times.get(profile, dict()).get(output, dict())
+
+            for (linker, seconds) in sorted(linkers.items(), key=lambda item: item[1]):
+                log.info('Link time', profile=profile, output=output, linker=linker, wall=f'{seconds:.3f}s')
+
+    # Keep the config resident and rebuild           #
+    # whenever sources, headers or deps change       #
+    # Returns once the config file itself changed    #
+    # ---------------------------------------------- #
+    def watch(self, is_built: bool = False):
+        from utils.watch import Watcher
+
+        watch_dirs = [self.dirs['source'], self.dirs['include'], self.dirs['deps']]
+        watcher = Watcher(watch_dirs, files=[self.config_path])
+
+        try:
+            if not is_built:
+                tracer.reset()
+                self.build()
+
+            while True:
+                log.info('Watching for changes...')
+                changed = watcher.wait()
+
+                if self.config_path in changed:
+                    log.info('Config file changed, reloading...')
+                    return
+
+                log.info('Detected changes', files=len(changed))
+
+                start = time.perf_counter()
+
+                # Timings of this rebuild only, the tracer
+                # would otherwise grow for the whole session
+                tracer.reset()
 
-        # Only perform the final compile
-        # once all object files have been built
-        if (all(res == True for res in results)):
-            self.compile_objects()
+                # Pick up added or removed files
+                self.discover_files()
+                self.build()
+                log.info('Rebuild finished', seconds=f'{time.perf_counter() - start:.3f}')
+        finally:
+            watcher.close()
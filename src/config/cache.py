@@ -0,0 +1,225 @@
+from utils.file import delete_dir, load_json, write_atomic
+from utils.logger import log
+from hashlib import blake2b
+from pathlib import Path
+from typing import Optional, Tuple
+import json
+import os
+import threading
+
+
+class ObjectCache(object):
+    # ========================================= #
+    # Content-addressed object file cache       #
+    # entries are keyed on the preprocessed     #
+    # source, compiler identity and flags       #
+    # ========================================= #
+    def __init__(self, path: Path, max_size: int):
+        self.path = path
+        self.max_size = max_size
+
+        # Entries are stored as '<key>.o' and '<key>.stderr'
+        # inside two-character fan-out directories
+        self.objects_dir = self.path / 'objects'
+        self.stats_path = self.path / 'stats.json'
+
+        # Statistics collected during this run, merged into
+        # the on-disk statistics once the build is done
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self.lock = threading.Lock()
+
+        # Hits and misses of every profile sharing the cache,
+        # since its builder last reported them
+        self.profile_stats = dict()
+
+        # Profiles building side by side sweep the cache
+        # and merge statistics one at a time
+        self.sweep_lock = threading.Lock()
+
+    # Hash arbitrary byte strings into a cache key           #
+    # ------------------------------------------------------ #
+    @staticmethod
+    def make_key(*parts: bytes) -> str:
+        digest = blake2b(digest_size=20)
+
+        for part in parts:
+            # Length-prefix each part, so that
+            # ('ab', 'c') and ('a', 'bc') differ
+            digest.update(len(part).to_bytes(8, 'little'))
+            digest.update(part)
+
+        return digest.hexdigest()
+
+    # Paths of the object and stderr files for a key           #
+    # -------------------------------------------------------- #
+    def get_entry_paths(self, key: str) -> Tuple[Path, Path]:
+        entry_dir = self.objects_dir / key[:2]
+
+        return (entry_dir / f'{key}.o', entry_dir / f'{key}.stderr')
+
+    # Count a lookup in the run and profile statistics            #
+    # ----------------------------------------------------------- #
+    def count_lookup(self, outcome: str, profile: Optional[str]):
+        with self.lock:
+            self.stats[outcome] += 1
+
+            if profile is not None:
+                stats = self.profile_stats.setdefault(profile, {'hits': 0, 'misses': 0})
+                stats[outcome] += 1
+
+    # Hits and misses of a profile since the last call           #
+    # ---------------------------------------------------------- #
+    def take_profile_stats(self, profile: str) -> dict:
+        with self.lock:
+            return self.profile_stats.pop(profile, {'hits': 0, 'misses': 0})
+
+    # Copy a cached object to `obj` on a hit                 #
+    # and return the captured stderr of the original compile #
+    # ------------------------------------------------------ #
+    def fetch(self, key: str, obj: Path, profile: Optional[str] = None) -> Optional[bytes]:
+        (entry_obj, entry_err) = self.get_entry_paths(key)
+
+        try:
+            stderr = entry_err.read_bytes()
+            data = entry_obj.read_bytes()
+
+            # Bump the entry for LRU eviction
+            os.utime(entry_obj)
+        except OSError:
+            self.count_lookup('misses', profile)
+            return None
+
+        # An interrupted copy never leaves a truncated object behind
+        write_atomic(obj, data)
+
+        self.count_lookup('hits', profile)
+
+        return stderr
+
+    # Store a freshly compiled object in the cache           #
+    # ------------------------------------------------------ #
+    def store(self, key: str, obj: Path, stderr: bytes):
+        (entry_obj, entry_err) = self.get_entry_paths(key)
+
+        try:
+            # The object file is written last, its
+            # presence marks the entry as complete
+            write_atomic(entry_err, stderr)
+            write_atomic(entry_obj, obj.read_bytes())
+        except OSError as err:
+            # A broken cache must never break the build
+            log.warning('Failed to store object in cache', key=key, error=str(err))
+            return
+
+        with self.lock:
+            self.stats['stores'] += 1
+
+    # Files of every complete entry with their stat           #
+    # Other builders may store or evict entries meanwhile,    #
+    # files going away and in-flight '.tmp' files are skipped #
+    # ------------------------------------------------------- #
+    def scan_entries(self):
+        if not self.objects_dir.exists():
+            return
+
+        for subdir in os.scandir(self.objects_dir):
+            if not subdir.is_dir():
+                continue
+
+            try:
+                entries = list(os.scandir(subdir.path))
+            except OSError:
+                continue
+
+            for entry in entries:
+                if '.tmp' in entry.name:
+                    continue
+
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+
+                yield (entry, stat)
+
+    # Evict least recently used entries until the           #
+    # cache fits into its maximum size                      #
+    # ----------------------------------------------------- #
+    def evict(self):
+        with self.sweep_lock:
+            entries = []
+            total = 0
+
+            for (entry, stat) in self.scan_entries():
+                total += stat.st_size
+
+                if entry.name.endswith('.o'):
+                    entries.append((stat.st_mtime_ns, entry.path))
+
+            if total <= self.max_size:
+                return
+
+            # Trim down to 90% of the limit, so that
+            # the next few stores don't trigger another sweep
+            limit = self.max_size * 9 // 10
+
+            for (_, path) in sorted(entries):
+                if total <= limit:
+                    break
+
+                for victim in (Path(path), Path(path).with_suffix('.stderr')):
+                    try:
+                        total -= victim.stat().st_size
+                        victim.unlink()
+                    except OSError:
+                        pass
+
+                with self.lock:
+                    self.stats['evictions'] += 1
+
+    # Read statistics stored on disk                  #
+    # ----------------------------------------------- #
+    def load_stats(self) -> dict:
+        stats = {key: 0 for key in self.stats}
+
+        stored = load_json(self.stats_path)
+        if isinstance(stored, dict):
+            stats.update(stored)
+
+        return stats
+
+    # Merge this run's statistics into the on-disk ones           #
+    # ----------------------------------------------------------- #
+    def save_stats(self):
+        with self.sweep_lock:
+            stats = self.load_stats()
+
+            with self.lock:
+                for key, value in self.stats.items():
+                    stats[key] += value
+                    self.stats[key] = 0
+
+            try:
+                write_atomic(self.stats_path, json.dumps(stats))
+            except OSError as err:
+                log.warning('Failed to save cache statistics', error=str(err))
+
+    # Total size and entry count of the cache           #
+    # ------------------------------------------------- #
+    def get_usage(self) -> Tuple[int, int]:
+        size = 0
+        count = 0
+
+        for (entry, stat) in self.scan_entries():
+            size += stat.st_size
+
+            if entry.name.endswith('.o'):
+                count += 1
+
+        return (size, count)
+
+    # Remove every entry and reset the statistics           #
+    # ----------------------------------------------------- #
+    def clear(self):
+        delete_dir(self.objects_dir)
+        delete_dir(self.stats_path)
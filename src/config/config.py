@@ -1,10 +1,43 @@
+from utils.file import load_pickle, write_atomic
 from utils.logger import log
+from utils.scan import DirectoryIndex
+from utils.trace import tracer
 from .depdict import DepDict
-from flatdict import FlatDict  # type: ignore
+from .probe import DependencyProbe
+from fnmatch import fnmatchcase
+from hashlib import blake2b, md5
 from pathlib import Path
 from typing import Tuple, Any
+import copy
+import os
+import pickle
 import yaml  # type: ignore
 
+# Use the libyaml bindings when PyYAML was built with them
+YamlLoader = getattr(yaml, 'CFullLoader', yaml.FullLoader)
+
+# Bump whenever the set or shape of resolved
+# attributes changes, invalidating old snapshots
+SNAPSHOT_VERSION = 4
+
+# Source file extensions per `project:language`
+SOURCE_EXTENSIONS = {
+    'c': ('.c',),
+    'cpp': ('.cpp', '.cc', '.cxx', '.c++'),
+}
+
+# Header file extensions used for discovery
+HEADER_EXTENSIONS = ('.h', '.hh', '.hpp', '.hxx', '.inl')
+
+# Resolved attributes stored in the config snapshot
+SNAPSHOT_ATTRS = (
+    'name', 'authors', 'version', 'language',
+    'dirs', 'build_files', 'build_type', 'compiler', 'profiles',
+    'raw_deps', 'deps', 'include_dirs', 'library_dirs', 'linker_args',
+    'build_flags', 'profile_options', 'cleanup_dirs', 'probe_stamps',
+    'targets',
+)
+
 
 class Config(object):
     # ======================================== #
@@ -15,14 +48,46 @@ def __init__(self, path: Path):
         # ----------------------------- #
         self.config_path = path.resolve()
 
-        # Loads a processed and raw config file
-        (self.config, self.raw_config) = self.load_config(self.config_path)
+        # Loads a raw config file and hashes its contents
+        with tracer.span('load config', 'config'):
+            (self.raw_config, self.config_hash) = self.load_config(self.config_path)
 
         # Main project directory extrapolated from
         # the config path. All directories in the build file
         # are relative to this path. (unless specified otherwise)
         self.root = self.config_path.parent
 
+        # Flattened config, only built when the
+        # snapshot below can't be used
+        self.config = None
+
+        # Currently active target profile
+        self.active_profile = ''
+
+        # Reuse the resolved config from the last run
+        # as long as the file and absolute paths didn't change
+        self.snapshot_path = self.get_snapshot_path()
+
+        with tracer.span('load snapshot', 'config'):
+            is_loaded = self.load_snapshot()
+
+        if not is_loaded:
+            with tracer.span('resolve config', 'config'):
+                self.resolve_config()
+                self.save_snapshot()
+
+        # Glob for files the config doesn't list.
+        # Never part of the snapshot, new files must show up
+        with tracer.span('discover files', 'config'):
+            self.discover_files()
+
+    # Process the config and resolve every path           #
+    # --------------------------------------------------- #
+    def resolve_config(self):
+        from flatdict import FlatDict  # type: ignore
+
+        self.config = FlatDict(self.raw_config)
+
         # Project configuration           #
         # ------------------------------- #
 
@@ -38,14 +103,24 @@ def __init__(self, path: Path):
         # Resolves all paths
         self.resolve_dirs()
 
+        # Targets of multi-target projects, in build order
+        self.targets = self.resolve_targets()
+
         # Building
         self.build_files = self.get_value('project:setup:files')
-        self.build_type = self.get_value('project:setup:type')
+
+        # Every target has a type of its own
+        if self.targets:
+            self.build_type = self.get_value_or('project:setup:type', None)
+        else:
+            self.build_type = self.get_value('project:setup:type')
         self.compiler = self.get_value('project:setup:compiler')
         self.profiles = self.get_value('project:setup:profiles')
 
-        # Currently active target profile
-        self.active_profile = ''
+        # Profiles may nest options, so keep them as
+        # a plain dictionary instead of flattened keys
+        if hasattr(self.profiles, 'as_dict'):
+            self.profiles = self.profiles.as_dict()
 
         # Resolve all files for building
         self.resolve_files()
@@ -65,8 +140,13 @@ def __init__(self, path: Path):
         # Linker arguments necessary for building
         self.linker_args = None
 
+        # Directory mtimes the probed system-wide
+        # dependencies depend on, validate the snapshot
+        self.probe_stamps = None
+
         # Resolves all variables above
-        self.process_deps()
+        with tracer.span('resolve dependencies', 'config'):
+            self.process_deps()
 
         # Push profile target directory
         # and push build flags according to profile
@@ -75,6 +155,52 @@ def __init__(self, path: Path):
         # Clean-up directories
         self.cleanup_dirs = [self.dirs['build'], self.dirs['target']]
 
+    # Resolve `project:targets` of multi-target projects           #
+    # ordered so that every target comes after the ones it         #
+    # depends on. Empty if the project builds a single output      #
+    # ------------------------------------------------------------ #
+    def resolve_targets(self) -> dict:
+        targets = dict()
+
+        for name, options in self.get_value_or('project:targets', dict()).items():
+            options = options or dict()
+
+            targets[name] = {
+                # Output name, like `project:name` for single targets
+                'name': options.get('name', name),
+                'type': options.get('type', 'exe'),
+
+                # Glob patterns relative to `dirs:source`
+                'sources': options.get('sources', ['*']),
+                'depends': options.get('depends', []),
+            }
+
+        # Depth-first, failing on unknown targets and cycles
+        order = dict()
+        visiting = set()
+
+        def visit(name: str, parent: str):
+            if name in order:
+                return
+
+            if name not in targets or name in visiting:
+                reason = 'an unknown' if name not in targets else 'a circular'
+                err = f'Target \"{parent}\" has {reason} dependency \"{name}\"'
+                log.error(err)
+                raise ValueError(err)
+
+            visiting.add(name)
+            for dep in targets[name]['depends']:
+                visit(dep, name)
+            visiting.remove(name)
+
+            order[name] = targets[name]
+
+        for name in targets:
+            visit(name, name)
+
+        return order
+
     # Resolves all directories to project root           #
     # /unless/ they're already absolute paths            #
     # -------------------------------------------------- #
@@ -151,16 +277,69 @@ def resolve_files(self):
                 # Put all found files back into the dict
                 self.build_files[key] = temp_paths
 
+    # Fill in empty source/header lists by scanning          #
+    # the source and include directories                     #
+    # ------------------------------------------------------ #
+    def discover_files(self):
+        discover = [
+            key for key in ('sources', 'include')
+            if not self.get_value_or(f'project:setup:files:{key}', [])
+        ]
+
+        if not discover:
+            return
+
+        log.info('Discovering source and header files...', keys=discover)
+
+        # Glob patterns relative to the scanned directory
+        include = self.get_value_or('project:setup:discovery:include', ['*'])
+        exclude = self.get_value_or('project:setup:discovery:exclude', [])
+
+        extensions = {
+            'sources': SOURCE_EXTENSIONS.get(self.language, SOURCE_EXTENSIONS['c']),
+            'include': HEADER_EXTENSIONS,
+        }
+        roots = {'sources': self.dirs['source'], 'include': self.dirs['include']}
+
+        index = DirectoryIndex(self.dirs['build'] / 'files.index')
+
+        for key in discover:
+            files = []
+
+            for rel_path in index.scan(roots[key]):
+                if not rel_path.endswith(extensions[key]):
+                    continue
+                if not any(fnmatchcase(rel_path, pattern) for pattern in include):
+                    continue
+                if any(fnmatchcase(rel_path, pattern) for pattern in exclude):
+                    continue
+
+                files.append(roots[key] / rel_path)
+
+            self.build_files[key] = files
+            log.info(f'Discovered {len(files)} file(s)', key=key, root=str(roots[key]))
+
+        index.save()
+
     # Resolve paths, add switches and collect dirs           #
     # using a utility dependency dictionary                  #
     # ------------------------------------------------------ #
     def process_deps(self):
         log.info('Processing dependencies...')
 
-        self.deps = DepDict(self.raw_deps)
+        # Resolution rewrites the dependencies in place, keep it
+        # out of the raw config, which validates the snapshot
+        self.deps = DepDict(copy.deepcopy(self.raw_deps))
 
-        # Resolve all paths
-        self.deps.resolve(self.dirs)
+        # Resolve all paths, system-wide dependencies
+        # are looked up through the probe cache
+        # Pruned against this config's dependencies by `gc`
+        probe = DependencyProbe(self.get_state_path('deps', '.probe'))
+        self.deps.resolve(self.dirs, probe)
+        probe.save()
+
+        # Directories the probe results depend on
+        self.probe_stamps = probe.stamps
 
         # Fetch include directories
         include_dirs = self.deps.get_include_dirs(self.dirs)
@@ -194,12 +373,41 @@ def build_profile_setup(self):
         # Re-assign into main directory map
         self.dirs['target'] = target_dirs
 
+        # Per-profile options besides build flags
+        self.profile_options = dict()
+
         # Fetch build flags from build profile information
+        # A profile is either a list of flags or a dictionary
+        # with 'flags' and additional options
         for profile_name, flags in self.profiles.items():
-            build_flags[profile_name] = flags
+            if isinstance(flags, dict):
+                options = dict(flags)
+                flags = options.pop('flags', [])
+            else:
+                options = dict()
+
+            build_flags[profile_name] = flags or []
+            self.profile_options[profile_name] = options
 
         return build_flags
 
+    # Acquire an option of the active profile          #
+    # like 'unity:batch_size'                          #
+    # ------------------------------------------------ #
+    def get_profile_option(self, key: str, default: Any) -> Any:
+        value = self.profile_options.get(self.active_profile, {})
+
+        for part in key.split(':'):
+            if not isinstance(value, dict):
+                return default
+
+            value = value.get(part)
+
+        if value is None:
+            return default
+        else:
+            return value
+
     # Selects a specific target from config file          #
     # using command-line arguments                        #
     # --------------------------------------------------- #
@@ -208,37 +416,134 @@ def set_active_profile(self, target: str):
             # Re-assign active profile to the one found
             self.active_profile = target
         else:
-            log.error(f'Target \"{target}\"')
+            log.error(f'Target \"{target}\" not found')
 
-            default_target = list(self.profiles[0])
+            default_target = list(self.profiles)[0]
             log.error(f'Defaulting to \"{default_target}\"')
 
             self.active_profile = default_target
 
-    # Load and process configuration file            #
-    # returning either a nested dictionary           #
-    # or a flatdict.FlatDict                         #
-    # ---------------------------------------------- #
-    def load_config(self, path: Path) -> Tuple[FlatDict, dict]:
+    # Load the raw configuration file           #
+    # returning a nested dictionary             #
+    # and a hash of the file contents           #
+    # ----------------------------------------- #
+    def load_config(self, path: Path) -> Tuple[dict, str]:
         log.info('Loading project configuration...')
 
-        result = (FlatDict(), dict())
-        with open(path) as file:
-            raw_dump = yaml.load(file, Loader=yaml.FullLoader)
-            result = (FlatDict(raw_dump), raw_dump)
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        raw_dump = yaml.load(data, Loader=YamlLoader)
 
         # Make sure to validate what we received
         # from the yaml dump
-        if result[0] is None or result[1] is None:
+        if not isinstance(raw_dump, dict):
             message = f'Unable to parse configuration file'
             log.error(message)
             raise IOError(message).with_traceback()
 
-        return result
+        return (raw_dump, blake2b(data, digest_size=16).hexdigest())
+
+    # Location of a state file inside the build directory           #
+    # one per config file sharing the directory                     #
+    # ------------------------------------------------------------- #
+    def get_state_path(self, name: str, suffix: str) -> Path:
+        build_dir = Path(self.get_value_or('project:dirs:build', 'build'))
+
+        if not build_dir.is_absolute():
+            build_dir = self.root / build_dir
+
+        path_hash = md5(str(self.config_path).encode('utf-8')).hexdigest()[:8]
+
+        return build_dir / f'{name}-{path_hash}{suffix}'
+
+    # Snapshot location inside the build directory           #
+    # ------------------------------------------------------ #
+    def get_snapshot_path(self) -> Path:
+        return self.get_state_path('config', '.snapshot')
+
+    # Absolute paths in the config and whether they exist           #
+    # resolution depends on these, so they validate the snapshot    #
+    # ------------------------------------------------------------- #
+    def get_absolute_paths(self) -> dict:
+        paths = dict()
+        stack = [self.raw_config]
+
+        while stack:
+            value = stack.pop()
+
+            if isinstance(value, dict):
+                stack += list(value.values())
+            elif isinstance(value, list):
+                stack += value
+            elif isinstance(value, str) and os.path.isabs(value):
+                paths[value] = os.path.exists(value)
+
+        return paths
+
+    # Restore resolved attributes from the snapshot           #
+    # returns False if it's missing or stale                  #
+    # ------------------------------------------------------- #
+    def load_snapshot(self) -> bool:
+        # Missing, truncated or from an incompatible version
+        snapshot = load_pickle(self.snapshot_path)
+        if not isinstance(snapshot, dict):
+            return False
+
+        is_valid = (
+            snapshot.get('version') == SNAPSHOT_VERSION
+            and snapshot.get('hash') == self.config_hash
+            and snapshot.get('root') == self.root
+            and snapshot.get('paths') == self.get_absolute_paths()
+            and DependencyProbe.is_fresh(snapshot['attrs'].get('probe_stamps', {}))
+        )
+
+        if not is_valid:
+            return False
+
+        log.info('Using resolved config snapshot', path=str(self.snapshot_path))
+
+        for attr in SNAPSHOT_ATTRS:
+            setattr(self, attr, snapshot['attrs'][attr])
+
+        return True
+
+    # Store resolved attributes for the next run           #
+    # ---------------------------------------------------- #
+    def save_snapshot(self):
+        attrs = dict()
+
+        for attr in SNAPSHOT_ATTRS:
+            value = getattr(self, attr)
+
+            # Store plain dictionaries, cheaper to unpickle
+            if hasattr(value, 'as_dict'):
+                value = value.as_dict()
+
+            attrs[attr] = value
+
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'hash': self.config_hash,
+            'root': self.root,
+            'paths': self.get_absolute_paths(),
+            'attrs': attrs,
+        }
+
+        try:
+            write_atomic(self.snapshot_path, pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError as err:
+            log.warning('Failed to save config snapshot', error=str(err))
 
     # Acquire a value from the flat dictionary           #
     # -------------------------------------------------- #
     def get_value(self, key: str) -> Any:
+        # Restored from a snapshot, flatten on demand
+        if self.config is None:
+            from flatdict import FlatDict  # type: ignore
+
+            self.config = FlatDict(self.raw_config)
+
         value = self.config.get(key)
 
         if value is None:
@@ -247,6 +552,25 @@ def get_value(self, key: str) -> Any:
         else:
             return value
 
+    # Acquire an optional value from the config           #
+    # falling back to `default` without any warnings      #
+    # --------------------------------------------------- #
+    def get_value_or(self, key: str, default: Any) -> Any:
+        # Walks the raw config, so it works
+        # without the flattened config as well
+        value = self.raw_config
+
+        for part in key.split(':'):
+            if not isinstance(value, dict):
+                return default
+
+            value = value.get(part)
+
+        if value is None:
+            return default
+        else:
+            return value
+
     # Traverse the yaml dump recursively                #
     # and retrieve value given a distinct key           #
     # ------------------------------------------------- #
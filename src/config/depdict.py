@@ -1,5 +1,6 @@
 from pathlib import Path
 from utils.logger import log
+from .probe import DependencyProbe, IMPLICIT_INCLUDE_DIRS
 
 
 class DepDict(dict):
@@ -14,8 +15,9 @@ def __init__(self, *arg, **kw):
     # this should canonicalize all relative paths           #
     # however, they should be touched if                    #
     # they're already absolute paths                        #
+    # System-wide dependencies are located by `probe`       #
     # ----------------------------------------------------- #
-    def resolve(self, dirs: dict):
+    def resolve(self, dirs: dict, probe: DependencyProbe):
         log.info('Resolving paths for dependencies...')
 
         for key, subkey in self.items():
@@ -25,10 +27,10 @@ def resolve(self, dirs: dict):
             has_library = subkey['header_only']
 
             if is_system_wide and is_enabled:
-                # Check all paths to make sure they're already
-                # canonicalized and that they exist
-                for path in subkey['search_paths'].values():
-                    exists = Path(path).exists()
+                # Search paths are optional hints, searched before
+                # pkg-config and the standard prefixes, but they
+                # have to be canonicalized
+                for path in (subkey.get('search_paths') or dict()).values():
                     is_absolute = Path(path).is_absolute()
 
                     if not is_absolute:
@@ -36,10 +38,15 @@ def resolve(self, dirs: dict):
                         log.error(err)
                         raise FileNotFoundError(err).with_traceback()
 
-                    if not exists:
-                        err = f"Path: \"{path}\" doesn't exist."
-                        log.error(err)
-                        raise FileNotFoundError(err).with_traceback()
+                # Cached while the searched directories don't change
+                probed = probe.probe(key, subkey)
+
+                if not probed['found']:
+                    err = f"Dependency: \"{key}\" not found on this system."
+                    log.error(err, headers=subkey.get('headers', []), libs=subkey.get('libs', []))
+                    raise FileNotFoundError(err)
+
+                self[key]['probed'] = probed
 
             # Resolve all relative paths
             elif not is_system_wide and is_enabled:
@@ -86,10 +93,12 @@ def get_include_dirs(self, dirs: dict) -> list:
                 includes.append(f'\"{include_dir}\"')
 
             if is_enabled and is_system_wide:
-                # Fetch system-wide include directories
-                include_dir = subkey['search_paths']['include']
+                # Fetch probed system-wide include directories
+                # the compiler's own ones are left out
+                include_dir = subkey['probed']['include']
 
-                includes.append(f'\"{include_dir}\"')
+                if include_dir and include_dir not in IMPLICIT_INCLUDE_DIRS:
+                    includes.append(f'\"{include_dir}\"')
 
         # Append main project source and include directories
         includes.append(f"\"{dirs['include']}\"")
@@ -124,10 +133,11 @@ def get_library_dirs(self, dirs: dict) -> list:
                     libs.append(f'\"{library_dir}\"')
 
                 if is_enabled and is_system_wide:
-                    # Fetch system-wide library directories
-                    library_dir = subkey['search_paths']['lib']
+                    # Fetch probed system-wide library directories
+                    library_dir = subkey['probed']['lib']
 
-                    libs.append(f'\"{library_dir}\"')
+                    if library_dir:
+                        libs.append(f'\"{library_dir}\"')
 
         return libs
 
@@ -164,3 +174,47 @@ def get_linker_args(self) -> list:
                     args.append(arg)
 
         return args
+
+    # Get paths of all library files the linker will read            #
+    # both listed in 'libs' and referenced through '-l' args         #
+    # Only existing files are returned                               #
+    # -------------------------------------------------------------- #
+    def get_library_files(self, linker_args: list) -> list:
+        files = []
+        lib_dirs = []
+
+        for subkey in self.values():
+            is_enabled = subkey['enabled']
+            is_system_wide = subkey['system_wide']
+            has_library = subkey['header_only']
+
+            if not is_enabled or has_library:
+                continue
+
+            if is_system_wide:
+                if not subkey['probed']['lib']:
+                    continue
+
+                lib_dir = Path(subkey['probed']['lib'])
+                libs = [lib_dir / lib for lib in subkey['libs']]
+            else:
+                lib_dir = Path(subkey['paths']['lib'])
+                libs = [Path(lib) for lib in subkey['libs']]
+
+            lib_dirs.append(lib_dir)
+            files += [lib for lib in libs if lib.is_file()]
+
+        # Resolve '-lname' against the dependency library dirs
+        for arg in linker_args:
+            if not arg.startswith('-l'):
+                continue
+
+            name = arg[2:]
+            for lib_dir in lib_dirs:
+                for candidate in (f'lib{name}.so', f'lib{name}.a', f'{name}.lib'):
+                    path = lib_dir / candidate
+
+                    if path.is_file():
+                        files.append(path)
+
+        return files
@@ -0,0 +1,142 @@
+from utils.file import load_json, write_atomic
+from utils.logger import log
+from pathlib import Path
+from typing import Dict, List
+import heapq
+import json
+import os
+
+# Seconds per byte of source for files without history,
+# until the history of other files gives a better one
+DEFAULT_RATE = 2e-5
+
+# Weight of the newest sample, the rest is the old estimate
+SMOOTHING = 0.5
+
+# Peak memory assumed for files without history,
+# until the history of other files gives a better one
+DEFAULT_RSS = 512 * 1024**2
+
+
+class CompileHistory(object):
+    # ========================================= #
+    # Compile durations and peak memory of      #
+    # earlier builds for one profile and flag   #
+    # set, used to start the slowest files      #
+    # first and to stay within the memory       #
+    # budget                                    #
+    # ========================================= #
+    def __init__(self, path: Path):
+        self.path = path
+
+        # Source path -> smoothed compile time in seconds
+        # and peak resident set size in bytes
+        self.entries: Dict[str, list] = self.load()
+        self.is_dirty = False
+
+        # Seconds per byte, fitted to the known files
+        self.rate = self.get_rate()
+
+        # Typical peak memory of the known files
+        self.typical_rss = self.get_typical_rss()
+
+    # Read the history from disk           #
+    # ------------------------------------ #
+    def load(self) -> dict:
+        entries = load_json(self.path)
+
+        if not isinstance(entries, dict):
+            return dict()
+
+        # Drop anything not shaped like an entry
+        return {
+            source: entry for (source, entry) in entries.items()
+            if isinstance(entry, list) and len(entry) == 2
+        }
+
+    # Write the history back if anything changed           #
+    # ---------------------------------------------------- #
+    def save(self):
+        if not self.is_dirty:
+            return
+
+        try:
+            write_atomic(self.path, json.dumps(self.entries, sort_keys=True))
+        except OSError as err:
+            log.warning('Failed to save compile history', error=str(err))
+
+    # Compile time per byte of source over all known files           #
+    # -------------------------------------------------------------- #
+    def get_rate(self) -> float:
+        total_time = 0.0
+        total_size = 0
+
+        for (source, (seconds, _)) in self.entries.items():
+            try:
+                total_size += os.stat(source).st_size
+                total_time += seconds
+            except OSError:
+                continue
+
+        if not total_size or not total_time:
+            return DEFAULT_RATE
+
+        return total_time / total_size
+
+    # Median peak memory over all known files           #
+    # ------------------------------------------------- #
+    def get_typical_rss(self) -> int:
+        sizes = sorted(max_rss for (_, max_rss) in self.entries.values() if max_rss)
+
+        if not sizes:
+            return DEFAULT_RSS
+
+        return sizes[len(sizes) // 2]
+
+    # Expected compile time of a source           #
+    # ------------------------------------------- #
+    def estimate(self, source: Path) -> float:
+        entry = self.entries.get(str(source))
+        if entry is not None:
+            return entry[0]
+
+        # New files are guessed from their size
+        try:
+            return os.stat(source).st_size * self.rate
+        except OSError:
+            return 0.0
+
+    # Expected peak memory of compiling a source           #
+    # ---------------------------------------------------- #
+    def estimate_rss(self, source: Path) -> int:
+        entry = self.entries.get(str(source))
+        if entry is not None and entry[1]:
+            return entry[1]
+
+        return self.typical_rss
+
+    # Add a measured compile time and peak memory           #
+    # ----------------------------------------------------- #
+    def record(self, source: Path, seconds: float, max_rss: int):
+        old = self.entries.get(str(source))
+        if old is not None:
+            seconds = SMOOTHING * seconds + (1 - SMOOTHING) * old[0]
+
+            # Growth is taken as is, shrinking only slowly,
+            # underestimating memory is what hurts
+            if max_rss < old[1]:
+                max_rss = int(SMOOTHING * max_rss + (1 - SMOOTHING) * old[1])
+
+        self.entries[str(source)] = [round(seconds, 4), max_rss]
+        self.is_dirty = True
+
+
+# Makespan of running jobs in order, each on
+# the first of `workers` parallel slots to free up
+def predict_makespan(durations: List[float], workers: int) -> float:
+    slots = [0.0] * max(1, workers)
+
+    for seconds in durations:
+        heapq.heappush(slots, heapq.heappop(slots) + seconds)
+
+    return max(slots)
@@ -0,0 +1,82 @@
+from utils.file import load_json, write_atomic
+from utils.logger import log
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import threading
+
+# Bumped whenever the entry format changes
+MANIFEST_VERSION = 1
+
+
+class BuildManifest(object):
+    # ========================================= #
+    # Every output the builder produced, with   #
+    # the profile and input it was built from   #
+    # so stale outputs can be removed alone     #
+    # ========================================= #
+    def __init__(self, path: Path):
+        self.path = path
+
+        # Output path -> entry with 'kind', 'profile',
+        # 'input' and 'files' created alongside the output
+        self.entries: Dict[str, dict] = self.load()
+        self.is_dirty = False
+
+        # Profiles build side by side
+        self.lock = threading.Lock()
+
+    # Read the manifest from disk           #
+    # ------------------------------------- #
+    def load(self) -> dict:
+        manifest = load_json(self.path)
+
+        if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+            return dict()
+
+        return manifest.get('outputs', dict())
+
+    # Write the manifest back if anything changed           #
+    # ----------------------------------------------------- #
+    def save(self):
+        with self.lock:
+            if not self.is_dirty:
+                return
+
+            manifest = {'version': MANIFEST_VERSION, 'outputs': self.entries}
+
+            try:
+                write_atomic(self.path, json.dumps(manifest, sort_keys=True))
+            except OSError as err:
+                log.warning('Failed to save build manifest', error=str(err))
+                return
+
+            self.is_dirty = False
+
+    # Record an output           #
+    # -------------------------- #
+    def add(self, output: Path, kind: str, profile: str, input: Optional[Path] = None, files: List[Path] = None):
+        entry = {
+            'kind': kind,
+            'profile': profile,
+            'input': str(input) if input is not None else None,
+            'files': [str(path) for path in files or []],
+        }
+
+        with self.lock:
+            if self.entries.get(str(output)) != entry:
+                self.entries[str(output)] = entry
+                self.is_dirty = True
+
+    # Forget an output           #
+    # -------------------------- #
+    def remove(self, output: str):
+        with self.lock:
+            if self.entries.pop(output, None) is not None:
+                self.is_dirty = True
+
+    # Snapshot of all entries           #
+    # --------------------------------- #
+    def get_entries(self) -> Dict[str, dict]:
+        with self.lock:
+            return dict(self.entries)
@@ -0,0 +1,282 @@
+from utils.file import load_pickle, write_atomic
+from utils.logger import log
+from hashlib import blake2b
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import json
+import os
+import pickle
+import shlex
+import shutil
+import subprocess as sp
+import threading
+
+# Installation prefixes searched after the configured paths
+SYSTEM_PREFIXES = ['/usr/local', '/usr', '/opt/homebrew', '/opt/local']
+
+# Searched by the compiler anyway, passing them with '-I'
+# breaks `#include_next` in the C++ standard library
+IMPLICIT_INCLUDE_DIRS = ('/usr/include', '/usr/local/include')
+
+
+class DependencyProbe(object):
+    # ========================================= #
+    # Locates headers and libraries of          #
+    # system-wide dependencies. Results are     #
+    # cached along with the mtimes of every     #
+    # directory looked at, and reused until     #
+    # one of those directories changes          #
+    # ========================================= #
+    def __init__(self, path: Path):
+        self.path = path
+
+        # Dependency name -> (config hash, directory stamps, result)
+        self.entries: Dict[str, tuple] = self.load()
+
+        # Whether anything was probed during this run
+        self.is_dirty = False
+
+        # Directory -> mtime of every directory the
+        # current results depend on, `None` if missing
+        self.stamps: Dict[str, Optional[int]] = dict()
+
+    # Read the cache from disk           #
+    # ---------------------------------- #
+    def load(self) -> dict:
+        entries = load_pickle(self.path)
+
+        return entries if isinstance(entries, dict) else dict()
+
+    # Write the cache back if anything was probed           #
+    # ----------------------------------------------------- #
+    def save(self):
+        if not self.is_dirty:
+            return
+
+        try:
+            write_atomic(self.path, pickle.dumps(self.entries, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError as err:
+            log.warning('Failed to save dependency probe cache', error=str(err))
+
+    # Current mtimes of directories, `None` for missing ones           #
+    # ---------------------------------------------------------------- #
+    @staticmethod
+    def get_stamps(dirs) -> Dict[str, Optional[int]]:
+        stamps = dict()
+
+        for path in dirs:
+            try:
+                stamps[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                stamps[path] = None
+
+        return stamps
+
+    # Whether none of the stamped directories changed           #
+    # --------------------------------------------------------- #
+    @staticmethod
+    def is_fresh(stamps: Dict[str, Optional[int]]) -> bool:
+        return DependencyProbe.get_stamps(stamps) == stamps
+
+    # Include and library directories to search, in order             #
+    # --------------------------------------------------------------- #
+    def get_search_dirs(self, name: str, dep: dict) -> Tuple[List[str], List[str]]:
+        hints = dep.get('search_paths') or dict()
+
+        include_dirs = [str(hints['include'])] if hints.get('include') else []
+        library_dirs = [str(hints['lib'])] if hints.get('lib') else []
+
+        # pkg-config leaves out the compiler's default directories
+        pkg_config = self.run_pkg_config(dep.get('pkg_config', name))
+        include_dirs += pkg_config[0]
+        library_dirs += pkg_config[1]
+
+        import sysconfig
+
+        # Debian-style 'lib/x86_64-linux-gnu' directories
+        multiarch = sysconfig.get_config_var('MULTIARCH')
+
+        for prefix in SYSTEM_PREFIXES:
+            include_dirs += [f'{prefix}/include', f'{prefix}/include/{name}']
+
+            if multiarch:
+                library_dirs.append(f'{prefix}/lib/{multiarch}')
+            library_dirs += [f'{prefix}/lib64', f'{prefix}/lib']
+
+        return (include_dirs, library_dirs)
+
+    # Include and library directories from pkg-config           #
+    # empty if it's not installed or doesn't know the package   #
+    # --------------------------------------------------------- #
+    def run_pkg_config(self, package: str) -> Tuple[List[str], List[str]]:
+        if shutil.which('pkg-config') is None:
+            return ([], [])
+
+        try:
+            process = sp.run(['pkg-config', '--cflags-only-I', '--libs-only-L', package], capture_output=True)
+        except OSError:
+            return ([], [])
+
+        if process.returncode != 0:
+            return ([], [])
+
+        flags = process.stdout.decode('utf-8', 'replace').split()
+
+        includes = [flag[2:] for flag in flags if flag.startswith('-I')]
+        libs = [flag[2:] for flag in flags if flag.startswith('-L')]
+
+        return (includes, libs)
+
+    # File names that satisfy the libraries of a dependency           #
+    # one list of alternatives per library                            #
+    # --------------------------------------------------------------- #
+    def get_library_names(self, dep: dict) -> List[List[str]]:
+        names = [[str(lib)] for lib in dep.get('libs') or []]
+
+        for arg in dep.get('args') or []:
+            if arg.startswith('-l'):
+                lib = arg[2:]
+                names.append([f'lib{lib}.so', f'lib{lib}.dylib', f'lib{lib}.a', f'{lib}.lib'])
+
+        return names
+
+    # Search for a dependency on disk           #
+    # ----------------------------------------- #
+    def search(self, name: str, dep: dict) -> Tuple[dict, List[str]]:
+        (include_dirs, library_dirs) = self.get_search_dirs(name, dep)
+        headers = dep.get('headers') or []
+
+        if headers:
+            # First directory holding every listed header
+            include_dir = next((
+                path for path in include_dirs
+                if all(os.path.isfile(os.path.join(path, header)) for header in headers)
+            ), None)
+        else:
+            # Nothing to look for, a directory of its own will do
+            generic = [f'{prefix}/include' for prefix in SYSTEM_PREFIXES]
+            include_dir = next((
+                path for path in include_dirs
+                if path not in generic and os.path.isdir(path)
+            ), None)
+
+        # First directory holding every library
+        library_dir = None
+        names = self.get_library_names(dep)
+        if not dep.get('header_only') and names:
+            library_dir = next((
+                path for path in library_dirs
+                if all(any(os.path.isfile(os.path.join(path, name)) for name in alternatives) for alternatives in names)
+            ), None)
+
+        is_found = (include_dir is not None or not headers) and (library_dir is not None or dep.get('header_only') or not names)
+
+        result = {'include': include_dir, 'lib': library_dir, 'found': bool(is_found)}
+
+        return (result, include_dirs + library_dirs)
+
+    # Locate a dependency, reusing the cached result           #
+    # while the searched directories didn't change             #
+    # -------------------------------------------------------- #
+    def probe(self, name: str, dep: dict) -> dict:
+        config = json.dumps(dep, sort_keys=True, default=str).encode('utf-8')
+        config_hash = blake2b(config, digest_size=16).hexdigest()
+
+        cached = self.entries.get(name)
+        if cached is not None and cached[0] == config_hash and self.is_fresh(cached[1]):
+            self.stamps.update(cached[1])
+            return cached[2]
+
+        log.info('Probing for dependency', name=name)
+
+        (result, searched) = self.search(name, dep)
+        stamps = self.get_stamps(searched)
+
+        self.entries[name] = (config_hash, stamps, result)
+        self.stamps.update(stamps)
+        self.is_dirty = True
+
+        return result
+
+
+class LinkerProbe(object):
+    # ========================================= #
+    # Which linkers the compiler driver takes   #
+    # with '-fuse-ld', like gcc before 12.1     #
+    # refusing mold. Results are cached along   #
+    # with the compiler and linker binaries     #
+    # ========================================= #
+    def __init__(self, path: Path):
+        self.path = path
+
+        # (compiler, linker) -> (binary stamps, supported)
+        self.entries: Dict[Tuple[str, str], tuple] = self.load()
+        self.is_dirty = False
+
+        # Profiles and targets link concurrently
+        self.lock = threading.Lock()
+
+    # Read the cache from disk           #
+    # ---------------------------------- #
+    def load(self) -> dict:
+        entries = load_pickle(self.path)
+
+        return entries if isinstance(entries, dict) else dict()
+
+    # Write the cache back if anything was probed           #
+    # ----------------------------------------------------- #
+    def save(self):
+        with self.lock:
+            if not self.is_dirty:
+                return
+
+            try:
+                write_atomic(self.path, pickle.dumps(self.entries, protocol=pickle.HIGHEST_PROTOCOL))
+            except OSError as err:
+                log.warning('Failed to save linker probe cache', error=str(err))
+                return
+
+            self.is_dirty = False
+
+    # Path, size and mtime of a program in $PATH           #
+    # `None` if it isn't installed                         #
+    # ---------------------------------------------------- #
+    @staticmethod
+    def get_stamp(program: str) -> Optional[tuple]:
+        path = shutil.which(program)
+        if path is None:
+            return None
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        return (path, st.st_size, st.st_mtime_ns)
+
+    # Whether `compiler` links with `-fuse-ld=<linker>`           #
+    # probed once per compiler and linker binary                  #
+    # ----------------------------------------------------------- #
+    def is_supported(self, compiler: List[str], linker: str, programs: Tuple[str, ...]) -> bool:
+        key = (shlex.join(compiler), linker)
+        stamps = tuple(self.get_stamp(program) for program in (compiler[0],) + programs)
+
+        with self.lock:
+            cached = self.entries.get(key)
+            if cached is not None and cached[0] == stamps:
+                return cached[1]
+
+            # Only asks the linker for its version, nothing is linked
+            try:
+                process = sp.run(compiler + [f'-fuse-ld={linker}', '-Wl,--version'], capture_output=True, stdin=sp.DEVNULL)
+                is_supported = process.returncode == 0
+            except OSError:
+                is_supported = False
+
+            if not is_supported:
+                log.warning(f'Compiler doesn\'t link with \"-fuse-ld={linker}\", skipping it', compiler=compiler[0])
+
+            self.entries[key] = (stamps, is_supported)
+            self.is_dirty = True
+
+            return is_supported
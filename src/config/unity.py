@@ -0,0 +1,116 @@
+from utils.logger import log
+from fnmatch import fnmatchcase
+from hashlib import md5
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+class UnityBuild(object):
+    # ========================================= #
+    # Groups sources into generated batch       #
+    # files compiled as single TUs              #
+    # ========================================= #
+    def __init__(self, source_dir: Path, out_dir: Path, batch_size: int, exclude: list, extension: str):
+        # Sources are bucketed by their path relative to this
+        self.source_dir = source_dir
+
+        # Where batch files are generated
+        self.out_dir = out_dir
+
+        # Maximum number of sources per batch
+        self.batch_size = max(1, batch_size)
+
+        # Glob patterns of sources that are compiled on their own
+        self.exclude = exclude
+
+        # Batch file extension, also the only one batched
+        self.extension = extension
+
+    # Path of a source relative to the source dir           #
+    # ----------------------------------------------------- #
+    def get_relative(self, source: Path) -> str:
+        try:
+            return source.relative_to(self.source_dir).as_posix()
+        except ValueError:
+            return source.as_posix()
+
+    # Split sources into batched and standalone ones           #
+    # -------------------------------------------------------- #
+    def split_sources(self, sources: List[Path]) -> Tuple[List[Path], List[Path]]:
+        batched = []
+        standalone = []
+
+        for source in sources:
+            rel_path = self.get_relative(source)
+
+            if source.suffix != self.extension:
+                standalone.append(source)
+            elif any(fnmatchcase(rel_path, pattern) for pattern in self.exclude):
+                standalone.append(source)
+            else:
+                batched.append(source)
+
+        return (batched, standalone)
+
+    # Assign sources to batches                                     #
+    # Each source is hashed into one of a power-of-two number       #
+    # of buckets, so adding or editing a file only touches its own  #
+    # bucket. Oversized buckets are split into `batch_size` chunks  #
+    # ------------------------------------------------------------- #
+    def get_batches(self, sources: List[Path]) -> Dict[str, List[Path]]:
+        count = max(1, -(-len(sources) // self.batch_size))
+        buckets = 1 << (count - 1).bit_length()
+
+        grouped: Dict[int, List[Tuple[str, Path]]] = dict()
+        for source in sources:
+            rel_path = self.get_relative(source)
+            bucket = int(md5(rel_path.encode('utf-8')).hexdigest(), 16) % buckets
+
+            grouped.setdefault(bucket, []).append((rel_path, source))
+
+        batches = dict()
+        for bucket, members in sorted(grouped.items()):
+            members.sort()
+
+            for chunk in range(0, len(members), self.batch_size):
+                name = f'unity-{bucket:04}-{chunk // self.batch_size}{self.extension}'
+                batches[name] = [source for (_, source) in members[chunk:chunk + self.batch_size]]
+
+        return batches
+
+    # Write batch files and return the TUs to compile           #
+    # Unchanged batches keep their mtime                        #
+    # --------------------------------------------------------- #
+    def generate(self, sources: List[Path]) -> List[Path]:
+        (batched, standalone) = self.split_sources(sources)
+        batches = self.get_batches(batched) if batched else dict()
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+
+        units = []
+        for name, members in batches.items():
+            lines = ['/* Generated by py-build, do not edit */']
+            lines += [f'#include "{source.as_posix()}"' for source in members]
+            text = '\n'.join(lines) + '\n'
+
+            path = self.out_dir / name
+
+            # Rewriting would bump the mtime and force a rebuild
+            try:
+                is_same = path.read_text() == text
+            except OSError:
+                is_same = False
+
+            if not is_same:
+                path.write_text(text)
+
+            units.append(path)
+
+        # Drop batches of an older layout
+        for path in self.out_dir.glob(f'unity-*{self.extension}'):
+            if path.name not in batches:
+                path.unlink()
+
+        log.info('Unity build', batches=len(batches), batched=len(batched), standalone=len(standalone))
+
+        return units + standalone
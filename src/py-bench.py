@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+'''py-bench.py -- benchmarks for py-build
+
+Generates synthetic C/C++ projects and measures how long py-build
+takes to load configs, build, rebuild and link them.
+
+Usage:
+    py-bench.py [--help]
+    py-bench.py generate [options] <dir>
+    py-bench.py run [options] <output>
+    py-bench.py compare <baseline> <current>
+
+Options:
+    --help              Shows this screen.
+    --tus=<n>           Number of translation units [default: 50]
+    --fan-in=<n>        Headers included by each TU [default: 5]
+    --depth=<n>         Depth of the header include tree [default: 3]
+    --deps=<n>          Number of vendor dependencies [default: 2]
+    --profiles=<n>      Number of build profiles [default: 2]
+    --language=<lang>   'c' or 'cpp' [default: c]
+    --compiler=<cc>     Compiler used by the project [default: gcc]
+    --seed=<n>          Seed of the project generator [default: 0]
+    -j, --jobs=<n>      Number of parallel compiler processes
+                        (defaults to the CPU count)
+    --repeat=<n>        Repetitions per scenario, the median
+                        is reported [default: 3]
+    --workdir=<dir>     Generate the project here instead of
+                        a temporary directory
+    --verbose           Keep py-build's own log output.
+
+Input:
+    <dir>               Where to generate the project
+    <output>            JSON file the results are written to
+    <baseline>          Results of an earlier run
+    <current>           Results to compare against the baseline
+
+Subcommands:
+    generate            Generates a synthetic project.
+    run                 Generates a project and runs all scenarios:
+                        cold/warm config load, full build, no-op rebuild,
+                        single-header-touch rebuild and link-only build.
+    compare             Compares two result files.
+'''
+
+from pathlib import Path
+import json
+import os
+import sys
+import tempfile
+
+from docopt import docopt  # type: ignore
+
+
+# Create a project generator from the options           #
+# ----------------------------------------------------- #
+def get_generator(args: dict, root: Path):
+    from bench.generator import ProjectGenerator
+
+    return ProjectGenerator(
+        root,
+        tus=int(args['--tus']),
+        fan_in=int(args['--fan-in']),
+        depth=int(args['--depth']),
+        deps=int(args['--deps']),
+        profiles=int(args['--profiles']),
+        language=args['--language'],
+        compiler=args['--compiler'],
+        seed=int(args['--seed']),
+    )
+
+
+# Only let warnings and errors through           #
+# ---------------------------------------------- #
+def silence_logs():
+    import logging
+    import structlog  # type: ignore
+
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+
+# Subcommands           #
+# --------------------- #
+def run_generate(args: dict):
+    path = get_generator(args, Path(args['<dir>']).resolve()).generate()
+    print(f'Generated project: {path}')
+
+
+def run_benchmarks(args: dict):
+    if not args['--verbose']:
+        silence_logs()
+
+    from bench.runner import BenchmarkRunner
+
+    jobs = int(args['--jobs']) if args['--jobs'] else (os.cpu_count() or 1)
+
+    with tempfile.TemporaryDirectory(prefix='py-bench-') as temp_dir:
+        root = Path(args['--workdir'] or temp_dir).resolve()
+
+        generator = get_generator(args, root)
+        config_path = generator.generate()
+
+        runner = BenchmarkRunner(config_path, jobs, repeat=int(args['--repeat']))
+        runner.run()
+
+        report = {
+            'metadata': runner.get_metadata(args['--compiler']),
+            'parameters': {
+                key.lstrip('-'): args[key]
+                for key in ('--tus', '--fan-in', '--depth', '--deps', '--profiles', '--language', '--seed')
+            },
+            'results': runner.get_results(),
+        }
+
+    with open(args['<output>'], 'w') as file:
+        json.dump(report, file, indent=2)
+
+    for (name, metrics) in report['results'].items():
+        print(f"{name:<20} {metrics['wall'] * 1000:10.1f} ms")
+
+
+def run_compare(args: dict):
+    with open(args['<baseline>']) as file:
+        baseline = json.load(file)
+    with open(args['<current>']) as file:
+        current = json.load(file)
+
+    if baseline['parameters'] != current['parameters']:
+        print('Warning: results were taken with different parameters', file=sys.stderr)
+
+    print(f"{'scenario':<20} {'metric':<18} {'baseline':>12} {'current':>12} {'change':>8}")
+
+    for (name, metrics) in current['results'].items():
+        for (metric, value) in metrics.items():
+            old = baseline['results'].get(name, {}).get(metric)
+            if old is None:
+                continue
+
+            change = f'{(value - old) / old * 100:+.1f}%' if old else 'n/a'
+            print(f'{name:<20} {metric:<18} {old:12.4f} {value:12.4f} {change:>8}')
+
+
+def main():
+    # Main entry point           #
+    # -------------------------- #
+
+    # Add `--help` if no arguments were supplied
+    if len(sys.argv) == 1:
+        sys.argv.append('--help')
+
+    args = docopt(__doc__, version=None)
+
+    if args['generate'] == True:
+        run_generate(args)
+    if args['run'] == True:
+        run_benchmarks(args)
+    if args['compare'] == True:
+        run_compare(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,45 +6,296 @@
 
 Usage:
     py-build.py [--help]
-    py-build.py clean <config> 
-    py-build.py build <config> <profile>
+    py-build.py clean [options] <config>
+    py-build.py gc [options] <config>
+    py-build.py build [options] <config> <profile>...
+    py-build.py build [options] --all-profiles <config>
+    py-build.py watch [options] <config> <profile>
+    py-build.py cache (stats|clear) [options] <config>
+    py-build.py worker [options]
 
 Options:
     --help              Shows this screen.
+    -j, --jobs=<n>      Number of parallel compiler processes
+                        (defaults to the CPU count)
+    --clear             Clears the terminal before running.
+    --profile-startup   Reports import and initialization timings.
+    --trace=<file>      Writes build timings in Chrome trace-event
+                        format (chrome://tracing, ui.perfetto.dev).
+    --slowest=<n>       Number of slowest translation units reported
+                        after a build [default: 5].
+    --all-profiles      Builds every profile defined in the config.
+    --keep-going        Keeps compiling the remaining files after
+                        a compile failed.
+    --fail-fast         Kills running compilers and starts no new ones
+                        as soon as a compile fails (the default).
+    --explain-schedule  Shows the predicted and actual compile time of
+                        the schedule (longest expected files first).
+    --memory-budget=<m> Memory compiles may use at once, judged by
+                        their recorded peak memory, like '16G', '60%'
+                        of the available memory or 'off'
+                        (defaults to `setup:memory_budget` or '75%').
+    --listen=<addr>     Address a worker listens on
+                        [default: 127.0.0.1:3633].
+    --allow=<names>     Comma-separated compiler names a worker runs
+                        [default: cc,c++,gcc,g++,clang,clang++].
 
 Input:
     <config>            Path to configuration file
     <profile>           What profile we're building
-                        (as defined in the config)
+                        (as defined in the config), several
+                        profiles are built side by side sharing
+                        the `--jobs` limit
 
 Subcommands:
     clean               Cleans build and output directories.
+    gc                  Removes only the outputs of sources, profiles
+                        and dependencies no longer in the config
+                        (also done after every build).
     build               Builds the entire project.
+    watch               Builds the project, then rebuilds whenever
+                        sources, headers or dependencies change.
+    cache stats         Shows object cache usage and hit/miss statistics.
+    cache clear         Removes all entries from the object cache.
+    worker              Compiles preprocessed sources sent by builders
+                        listing this host in `setup:distributed:hosts`.
 '''
 
+import time
+
+# Reference point for `--profile-startup`
+STARTUP_TIME = time.perf_counter()
+
 from pathlib import Path
 import os
 import sys
 
 from docopt import docopt  # type: ignore
-import colorama  # type: ignore
 
 from utils.logger import log
-from config.builder import Builder
 
 
-def main():
-    # Main entry point           #
-    # -------------------------- #
+class StartupProfile(object):
+    # ======================================== #
+    # Collects timings of the startup path     #
+    # reported with `--profile-startup`        #
+    # ======================================== #
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.timings = [('import docopt', time.perf_counter() - STARTUP_TIME)]
+        self.last = time.perf_counter()
+
+    # Record the time since the previous mark           #
+    # ------------------------------------------------- #
+    def mark(self, name: str):
+        now = time.perf_counter()
+        self.timings.append((name, now - self.last))
+        self.last = now
+
+    # Import modules one by one, so that each           #
+    # gets its own entry instead of a lump sum          #
+    # ------------------------------------------------- #
+    def import_modules(self, *names: str):
+        import importlib
+
+        for name in names:
+            if self.enabled:
+                importlib.import_module(name)
+                self.mark(f'import {name}')
+
+    # Log all timings           #
+    # ------------------------- #
+    def report(self):
+        if not self.enabled:
+            return
 
-    # Clear the screen
+        total = time.perf_counter() - STARTUP_TIME
+
+        for (name, seconds) in self.timings:
+            log.info('Startup', phase=name, ms=f'{seconds * 1000:.1f}')
+
+        log.info('Startup', phase='total', ms=f'{total * 1000:.1f}')
+
+
+# Clear the terminal without spawning a shell           #
+# ----------------------------------------------------- #
+def clear_screen():
     if os.name == 'posix':
-        os.system('clear')
+        sys.stdout.write('\033[2J\033[H')
+        sys.stdout.flush()
     else:
         os.system('cls')
 
-    # Initialize colorama for colored logging
-    colorama.init()
+
+# Load the config and set up the builder           #
+# ------------------------------------------------ #
+def load_builder(args: dict, profile: StartupProfile):
+    profile.import_modules('structlog', 'yaml', 'config.builder')
+
+    from config.builder import Builder
+
+    config_path = args['<config>']
+    log.debug('Found config path', path=config_path)
+
+    # Initialize main `Builder` object
+    builder = Builder(Path(config_path))
+    profile.mark('load config')
+
+    # Selected target profile, the first one
+    # if several are built at once
+    targets = args['<profile>']
+    if targets:
+        builder.set_active_profile(targets[0])
+
+    # Size of the compile worker pool
+    jobs = args['--jobs']
+    if jobs is not None:
+        if not jobs.isdigit():
+            log.error(f'Invalid job count \"{jobs}\"')
+            sys.exit(1)
+
+        builder.set_jobs(int(jobs))
+
+    # Memory admission of compile jobs
+    budget = args['--memory-budget']
+    if budget is not None:
+        try:
+            builder.set_memory_budget(budget)
+        except ValueError:
+            log.error(f'Invalid memory budget \"{budget}\"')
+            sys.exit(1)
+
+    builder.keep_going = args['--keep-going'] and not args['--fail-fast']
+    builder.explain_schedule = args['--explain-schedule']
+
+    return builder
+
+
+# Subcommands           #
+# --------------------- #
+def run_clean(builder):
+    # Clean directories...
+    log.info('Starting clean-up...')
+    builder.clean_up()
+
+
+def run_gc(builder):
+    # Prune outputs the config no longer produces
+    log.info('Collecting stale outputs...')
+    builder.collect_garbage()
+
+
+def run_build(builder, args: dict) -> bool:
+    from utils.trace import tracer
+
+    # Profiles to build
+    if args['--all-profiles']:
+        targets = list(builder.profiles)
+    else:
+        targets = args['<profile>']
+
+    # Build the project
+    log.info('Starting build...')
+    is_built = builder.build_profiles(targets)
+
+    # Drop outputs of removed sources and profiles
+    if builder.get_value_or('project:setup:gc', True):
+        builder.collect_garbage()
+
+    slowest = args['--slowest']
+    if slowest.isdigit() and int(slowest) > 0:
+        builder.report_timings(int(slowest))
+
+    if args['--trace']:
+        log.info('Writing build trace', path=args['--trace'])
+        tracer.write(Path(args['--trace']))
+
+    return is_built
+
+
+def run_watch(builder, args: dict):
+    from config.builder import Builder
+
+    # Rebuild on changes until interrupted
+    log.info('Starting watch mode...')
+    try:
+        is_built = False
+
+        while True:
+            builder.prepare_build_dirs()
+            builder.watch(is_built)
+
+            # The config file changed, load it again
+            (target, limiter) = (builder.active_profile, builder.limiter)
+            (keep_going, explain_schedule, memory) = (builder.keep_going, builder.explain_schedule, builder.memory)
+
+            # A half-written config keeps the previous
+            # one around until the next change
+            try:
+                new_builder = Builder(builder.config_path)
+            except Exception as err:
+                log.error('Failed to reload config, keeping the previous one', error=str(err))
+
+                is_built = True
+                continue
+
+            builder = new_builder
+            builder.set_active_profile(target)
+            builder.set_limiter(limiter)
+            builder.keep_going = keep_going
+            builder.explain_schedule = explain_schedule
+
+            # Otherwise `setup:memory_budget` of the new config applies
+            if args['--memory-budget'] is not None:
+                builder.memory = memory
+
+            is_built = False
+    except KeyboardInterrupt:
+        log.info('Stopped watching')
+
+
+def run_worker(args: dict):
+    from remote.worker import run_worker as serve
+
+    jobs = args['--jobs'] or str(os.cpu_count() or 1)
+    if not jobs.isdigit():
+        log.error(f'Invalid job count \"{jobs}\"')
+        sys.exit(1)
+
+    compilers = [name for name in args['--allow'].split(',') if name]
+
+    # Serve until interrupted
+    try:
+        serve(args['--listen'], int(jobs), compilers)
+    except KeyboardInterrupt:
+        log.info('Worker stopped')
+
+
+def run_cache(builder, args: dict):
+    from utils.file import format_size
+
+    # Inspect or wipe the object cache
+    cache = builder.cache
+    if cache is None:
+        log.warning('Object cache is disabled in the config')
+    elif args['stats'] == True:
+        (size, count) = cache.get_usage()
+        stats = cache.load_stats()
+
+        lookups = stats['hits'] + stats['misses']
+        ratio = 100 * stats['hits'] / lookups if lookups else 0.0
+
+        log.info('Cache directory', path=str(cache.path))
+        log.info('Cache size', size=format_size(size), limit=format_size(cache.max_size), entries=count)
+        log.info('Cache statistics', hit_ratio=f'{ratio:.1f}%', **stats)
+    elif args['clear'] == True:
+        log.info('Clearing object cache...')
+        cache.clear()
+
+
+def main():
+    # Main entry point           #
+    # -------------------------- #
 
     # Launch arguments parsing           #
     # ---------------------------------- #
@@ -52,38 +303,59 @@ def main():
     # Add `--help` if no arguments were supplied
     if len(sys.argv) == 1:
         sys.argv.append('--help')
-        args = docopt(__doc__, version=None, options_first=True)
-    else:
-        args = docopt(__doc__, version=None, options_first=True)
 
-        config_path = args['<config>']
-        if config_path:
-            log.debug('Found config path', path=config_path)
+    args = docopt(__doc__, version=None)
 
-        # Turn the `str` path into `pathlib.Path`
-        config_path = Path(config_path)
+    # Only clear the screen when asked to
+    if args['--clear']:
+        clear_screen()
 
-        # Initialize main `Builder` object
-        builder = Builder(config_path)
+    # Windows consoles need colorama for colored logging
+    if os.name == 'nt':
+        import colorama  # type: ignore
+        colorama.init()
 
-        # Selected target profile
-        target = args['<profile>']
-        builder.set_active_profile(target)
+    # Workers don't load a project
+    if args['worker'] == True:
+        run_worker(args)
+        return
 
-        # Initialize the builder           #
-        # -------------------------------- #
+    profile = StartupProfile(args['--profile-startup'])
 
-        log.info('Initializing build system...')
+    # Initialize the builder           #
+    # -------------------------------- #
+    builder = load_builder(args, profile)
+    profile.report()
 
+    log.info('Initializing build system...')
+
+    # Already loaded along with the builder
+    from utils.jobs import JobserverError, create_limiter
+
+    # One jobserver for the whole process, shared with a parent
+    # make and kept across config reloads in watch mode
+    if args['build'] == True or args['watch'] == True:
+        builder.set_limiter(create_limiter(builder.jobs))
+
+    try:
         if args['clean'] == True:
-            # Clean directories...
-            log.info('Starting clean-up...')
-            builder.clean_up()
+            run_clean(builder)
+        if args['gc'] == True:
+            run_gc(builder)
+        if args['cache'] == True:
+            run_cache(builder, args)
         if args['build'] == True:
-            # Build the project
-            log.info('Starting build...')
-            builder.prepare_build_dirs()
-            builder.build()
+            # Failed builds must fail CI jobs and scripts too
+            if not run_build(builder, args):
+                log.error('Build failed')
+                sys.exit(1)
+        if args['watch'] == True:
+            run_watch(builder, args)
+    except JobserverError as err:
+        log.error('Build failed', error=str(err))
+        sys.exit(1)
+    finally:
+        builder.limiter.close()
 
 
 if __name__ == '__main__':
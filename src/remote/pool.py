@@ -0,0 +1,217 @@
+from utils.file import write_atomic
+from utils.logger import log
+from utils.process import ProcessResult
+from .protocol import ProtocolError, RequestRefused, parse_address, recv_message, send_message
+from pathlib import Path
+from typing import List, Optional
+import socket
+import threading
+import time
+
+# Flags only the local preprocessing step needs, with the
+# number of arguments following each one
+PREPROCESSOR_FLAGS = {
+    '-MMD': 0, '-MD': 0, '-MP': 0,
+    '-I': 1, '-include': 1, '-isystem': 1, '-iquote': 1, '-idirafter': 1,
+}
+
+
+# Strip the source file and preprocessor-only flags from
+# a compile command, leaving what the worker compiles with
+def get_remote_args(flags: List[str], source: Path) -> List[str]:
+    args = []
+
+    flags = iter(flags)
+    for flag in flags:
+        if flag == str(source):
+            continue
+
+        if flag in PREPROCESSOR_FLAGS:
+            for _ in range(PREPROCESSOR_FLAGS[flag]):
+                next(flags, None)
+            continue
+
+        # Joined form like '-Iinclude'
+        if flag.startswith(('-I', '-isystem', '-iquote', '-idirafter')):
+            continue
+
+        args.append(flag)
+
+    return args
+
+
+class RemoteHost(object):
+    # ========================================= #
+    # A worker as seen by the builder           #
+    # ========================================= #
+    def __init__(self, address: str):
+        self.name = address
+        self.address = parse_address(address, default_host='127.0.0.1')
+
+        # Compile slots of the worker, known once probed
+        self.jobs = 0
+
+        # Compiles this builder has running on the worker
+        # and the worker's own count, including other builders
+        self.inflight = 0
+        self.reported = 0
+
+        # Unreachable workers are skipped until then
+        self.dead_until = 0.0
+
+    # How busy the worker is, 1.0 is fully loaded           #
+    # ----------------------------------------------------- #
+    def get_load(self) -> float:
+        return max(self.inflight, self.reported) / max(1, self.jobs)
+
+    # Open a connection to the worker           #
+    # ----------------------------------------- #
+    def connect(self, timeout: float) -> socket.socket:
+        return socket.create_connection(self.address, timeout=timeout)
+
+
+class WorkerPool(object):
+    # ========================================= #
+    # Sends compiles to `py-build worker`       #
+    # daemons, picking the least loaded one     #
+    # ========================================= #
+    def __init__(self, hosts: List[str], timeout: float = 120.0, retry_delay: float = 30.0):
+        self.hosts = [RemoteHost(host) for host in hosts]
+
+        # Seconds a compile may take before the worker counts as dead
+        self.timeout = timeout
+
+        # Seconds until a dead worker is tried again
+        self.retry_delay = retry_delay
+
+        # Arguments workers refused, those compile locally
+        self.refused = set()
+
+        self.lock = threading.Lock()
+        self.probe_lock = threading.Lock()
+        self.is_probed = False
+
+    # Ask every worker for its capacity, once           #
+    # ------------------------------------------------- #
+    def probe(self):
+        with self.probe_lock:
+            if self.is_probed:
+                return
+
+            for host in self.hosts:
+                try:
+                    with host.connect(timeout=5.0) as sock:
+                        send_message(sock, {'type': 'status'})
+                        (status, _) = recv_message(sock)
+
+                    if status is None:
+                        raise ProtocolError('No status reply')
+
+                    host.jobs = int(status['jobs'])
+                    host.reported = int(status['active'])
+
+                    log.info('Remote worker', host=host.name, jobs=host.jobs, active=host.reported)
+                except (OSError, ProtocolError, KeyError, ValueError) as err:
+                    log.warning('Remote worker unreachable', host=host.name, error=str(err))
+                    host.dead_until = time.monotonic() + self.retry_delay
+
+            self.is_probed = True
+
+    # Reserve a slot on the least loaded worker           #
+    # --------------------------------------------------- #
+    def acquire(self, tried: List[RemoteHost]) -> Optional[RemoteHost]:
+        now = time.monotonic()
+
+        with self.lock:
+            hosts = [host for host in self.hosts if host not in tried and host.dead_until <= now]
+            if not hosts:
+                return None
+
+            host = min(hosts, key=lambda host: host.get_load())
+
+            # Revived workers report their capacity with the first reply
+            host.jobs = host.jobs or 1
+            host.inflight += 1
+
+            return host
+
+    # Give the slot back, marking the worker dead if it failed           #
+    # ------------------------------------------------------------------ #
+    def release(self, host: RemoteHost, reply: Optional[dict]):
+        with self.lock:
+            host.inflight -= 1
+
+            if reply is None:
+                host.dead_until = time.monotonic() + self.retry_delay
+            else:
+                host.jobs = int(reply.get('jobs', host.jobs))
+                host.reported = int(reply.get('active', host.reported))
+
+    # Send a single compile to a worker           #
+    # ------------------------------------------- #
+    def send_compile(self, host: RemoteHost, request: dict, source: bytes) -> tuple:
+        with host.connect(timeout=self.timeout) as sock:
+            send_message(sock, request, source)
+            (reply, payloads) = recv_message(sock)
+
+        if reply is None or len(payloads) != 2:
+            raise ProtocolError('Incomplete reply')
+
+        if 'error' in reply:
+            raise RequestRefused(reply['error'])
+
+        return (reply, payloads[0], payloads[1])
+
+    # Compile a preprocessed source remotely and write the object           #
+    # Returns `None` if no worker could take it, so that                    #
+    # the caller falls back to compiling locally                            #
+    # --------------------------------------------------------------------- #
+    def compile(self, cmd: List[str], compiler: str, language: str, args: List[str],
+                source: bytes, obj: Path) -> Optional[ProcessResult]:
+        self.probe()
+
+        with self.lock:
+            if tuple(args) in self.refused:
+                return None
+
+        request = {'type': 'compile', 'compiler': compiler, 'language': language, 'args': args}
+
+        # Every worker gets one try before giving up
+        tried = []
+        while True:
+            host = self.acquire(tried)
+            if host is None:
+                return None
+
+            tried.append(host)
+            start = time.perf_counter()
+
+            try:
+                (reply, data, stderr) = self.send_compile(host, request, source)
+            except RequestRefused as err:
+                # The worker is fine, but every worker would refuse
+                # the same arguments, so these compile locally
+                self.release(host, dict())
+
+                with self.lock:
+                    self.refused.add(tuple(args))
+
+                log.warning('Remote compile refused, compiling locally', host=host.name, file=obj.name, error=str(err))
+                return None
+            except (OSError, ProtocolError) as err:
+                self.release(host, None)
+                log.warning('Remote compile failed, retrying', host=host.name, file=obj.name, error=str(err))
+                continue
+
+            self.release(host, reply)
+
+            returncode = int(reply.get('returncode', 1))
+            if returncode == 0:
+                write_atomic(obj, data)
+
+            return ProcessResult(
+                cmd, returncode, b'', stderr,
+                wall=time.perf_counter() - start,
+                cpu=float(reply.get('cpu', 0.0)),
+                max_rss=int(reply.get('max_rss', 0)),
+            )
@@ -0,0 +1,97 @@
+from typing import List, Optional, Tuple
+import json
+import socket
+
+# Port `py-build worker` listens on by default
+DEFAULT_PORT = 3633
+
+# Bumped on incompatible changes, both ends must agree
+PROTOCOL_VERSION = 1
+
+# Sanity limits, a bad peer mustn't make us allocate gigabytes
+MAX_HEADER_SIZE = 1 << 20
+MAX_PAYLOAD_SIZE = 1 << 30
+
+
+class ProtocolError(Exception):
+    # ========================================= #
+    # Malformed or unexpected message           #
+    # ========================================= #
+    pass
+
+
+class RequestRefused(Exception):
+    # ========================================= #
+    # The peer understood the request           #
+    # but won't run it                          #
+    # ========================================= #
+    pass
+
+
+# Splits 'host:port' into its parts, the port is optional
+def parse_address(address: str, default_host: str = '') -> Tuple[str, int]:
+    (host, sep, port) = address.rpartition(':')
+
+    if not sep:
+        return (address or default_host, DEFAULT_PORT)
+
+    return (host.strip('[]') or default_host, int(port))
+
+
+# Reads exactly `size` bytes or fails if the peer hung up
+def recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+
+    while size > 0:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ProtocolError('Connection closed mid-message')
+
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
+
+
+# Messages are a length-prefixed JSON header followed by
+# the binary payloads whose sizes the header lists
+def send_message(sock: socket.socket, header: dict, *payloads: bytes):
+    header = dict(header, version=PROTOCOL_VERSION, sizes=[len(payload) for payload in payloads])
+    data = json.dumps(header).encode('utf-8')
+
+    sock.sendall(len(data).to_bytes(4, 'big') + data)
+
+    for payload in payloads:
+        sock.sendall(payload)
+
+
+# Receives a message, the header is `None` if the peer closed
+# the connection cleanly between two messages
+def recv_message(sock: socket.socket) -> Tuple[Optional[dict], List[bytes]]:
+    prefix = sock.recv(4)
+    if not prefix:
+        return (None, [])
+
+    if len(prefix) < 4:
+        prefix += recv_exact(sock, 4 - len(prefix))
+
+    size = int.from_bytes(prefix, 'big')
+    if size > MAX_HEADER_SIZE:
+        raise ProtocolError(f'Header too large ({size} bytes)')
+
+    try:
+        header = json.loads(recv_exact(sock, size).decode('utf-8'))
+    except ValueError:
+        raise ProtocolError('Malformed header')
+
+    if not isinstance(header, dict) or header.get('version') != PROTOCOL_VERSION:
+        raise ProtocolError('Unsupported protocol version')
+
+    payloads = []
+    for payload_size in header.get('sizes', []):
+        if not isinstance(payload_size, int) or not 0 <= payload_size <= MAX_PAYLOAD_SIZE:
+            raise ProtocolError('Invalid payload size')
+
+        payloads.append(recv_exact(sock, payload_size))
+
+    return (header, payloads)
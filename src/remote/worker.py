@@ -0,0 +1,185 @@
+from utils.jobs import JobLimiter
+from utils.logger import log
+from utils.process import run_process
+from .protocol import ProtocolError, parse_address, recv_message, send_message
+from pathlib import Path
+from typing import List, Optional, Tuple
+import os
+import re
+import socket
+import socketserver
+import tempfile
+import threading
+
+# Preprocessed input languages and their file extensions
+LANGUAGES = {'c': ('cpp-output', '.i'), 'cpp': ('c++-cpp-output', '.ii')}
+
+# Flags compiles may use: optimization, warnings, code generation,
+# machine and language options, defines and debug info. Values
+# can't contain '/' or ',' before the '=', which rules out paths
+# and options passed on to the assembler, preprocessor or linker
+ALLOWED_FLAGS = re.compile(
+    r'-(?:'
+    r'O\w*'
+    r'|[Wfmg][\w+-]*(?:=[\w+.,-]*)?'
+    r'|std=[\w+-]+'
+    r'|[DU]\w+(?:=.*)?'
+    r'|w|pedantic(?:-errors)?|pthread|pipe'
+    r')'
+)
+
+# Options naming a file to read or write, even a relative
+# one, like a sanitizer ignore list or a profile directory
+PATH_OPTIONS = (
+    '-fplugin', '-fprofile', '-fauto-profile', '-fcallgraph-info', '-fdump-', '-fopt-info',
+    '-fsanitize-ignorelist', '-fsanitize-blacklist', '-fsanitize-coverage-',
+    '-fxray-attr-list', '-fxray-always-instrument', '-fxray-never-instrument',
+)
+
+
+# Whether a worker may compile with `arg`, nothing
+# outside the scratch directory may be read or written
+def is_allowed_flag(arg: str) -> bool:
+    if ALLOWED_FLAGS.fullmatch(arg) is None:
+        return False
+
+    # Defines only affect preprocessing, which already happened
+    if arg.startswith(('-D', '-U')):
+        return True
+
+    (option, sep, value) = arg.partition('=')
+
+    return not sep or ('..' not in value and not option.startswith(PATH_OPTIONS))
+
+
+class WorkerHandler(socketserver.BaseRequestHandler):
+    # ========================================= #
+    # Serves the requests of one connection     #
+    # ========================================= #
+    def handle(self):
+        sock = self.request
+
+        while True:
+            try:
+                (header, payloads) = recv_message(sock)
+            except (OSError, ProtocolError) as err:
+                log.warning('Dropping connection', peer=self.client_address[0], error=str(err))
+                return
+
+            if header is None:
+                return
+
+            if header.get('type') == 'status':
+                send_message(sock, self.server.get_status())
+            elif header.get('type') == 'compile' and len(payloads) == 1:
+                (reply, obj, stderr) = self.server.compile(header, payloads[0])
+                send_message(sock, reply, obj, stderr)
+            else:
+                send_message(sock, {'error': 'Unknown request'})
+                return
+
+
+class WorkerServer(socketserver.ThreadingTCPServer):
+    # ========================================= #
+    # `py-build worker` daemon, compiles        #
+    # preprocessed sources sent by builders     #
+    # on other machines                         #
+    # ========================================= #
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: Tuple[str, int], jobs: int, compilers: List[str]):
+        if ':' in address[0]:
+            self.address_family = socket.AF_INET6
+
+        super().__init__(address, WorkerHandler)
+
+        self.jobs = max(1, jobs)
+        self.limiter = JobLimiter(self.jobs)
+
+        # Compiler names requests may ask for
+        self.compilers = set(compilers)
+
+        # Compiles running or waiting for a slot
+        self.active = 0
+        self.lock = threading.Lock()
+
+    # Capacity and load, used by builders to pick a worker           #
+    # -------------------------------------------------------------- #
+    def get_status(self) -> dict:
+        with self.lock:
+            return {'jobs': self.jobs, 'active': self.active}
+
+    # Check a compile request, returns the reason it's refused           #
+    # ------------------------------------------------------------------ #
+    def validate(self, header: dict) -> Optional[str]:
+        compiler = header.get('compiler')
+        if not isinstance(compiler, str) or compiler not in self.compilers:
+            return f'Compiler \"{compiler}\" not allowed'
+
+        if header.get('language') not in LANGUAGES:
+            return 'Unknown language'
+
+        args = header.get('args')
+        if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+            return 'Invalid arguments'
+
+        for arg in args:
+            if not is_allowed_flag(arg):
+                return f'Argument \"{arg}\" not allowed'
+
+        return None
+
+    # Compile a preprocessed source in a scratch directory           #
+    # returning the reply header, object file and stderr             #
+    # -------------------------------------------------------------- #
+    def compile(self, header: dict, source: bytes) -> Tuple[dict, bytes, bytes]:
+        error = self.validate(header)
+        if error is not None:
+            return ({'error': error}, b'', b'')
+
+        (language, extension) = LANGUAGES[header['language']]
+
+        with self.lock:
+            self.active += 1
+
+        try:
+            with tempfile.TemporaryDirectory(prefix='py-build-') as temp_dir:
+                src_path = Path(temp_dir) / f'input{extension}'
+                obj_path = Path(temp_dir) / 'output.o'
+                src_path.write_bytes(source)
+
+                cmd = [header['compiler'], '-x', language, '-c', str(src_path), '-o', str(obj_path)] + header['args']
+
+                # Dumps and other side files stay in the scratch directory
+                with self.limiter.slot():
+                    process = run_process(cmd, cwd=temp_dir)
+
+                obj = obj_path.read_bytes() if process.returncode == 0 else b''
+        finally:
+            with self.lock:
+                self.active -= 1
+
+        reply = {
+            'returncode': process.returncode,
+            'wall': process.wall,
+            'cpu': process.cpu,
+            'max_rss': process.max_rss,
+            'jobs': self.jobs,
+            'active': self.active,
+        }
+
+        return (reply, obj, process.stderr)
+
+
+# Runs a worker until interrupted
+def run_worker(listen: str, jobs: int, compilers: List[str]):
+    address = parse_address(listen, default_host='127.0.0.1')
+    server = WorkerServer(address, jobs, compilers)
+
+    log.info('Worker listening', address=f'{address[0]}:{address[1]}', jobs=server.jobs, pid=os.getpid())
+
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
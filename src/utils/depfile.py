@@ -0,0 +1,57 @@
+from pathlib import Path
+from typing import List
+
+
+# Parses a Makefile-style dependency file (as emitted by `-MMD -MF`)
+# and returns the prerequisites of its first rule.
+# Phony targets generated by `-MP` are ignored.
+def parse_depfile(path: Path) -> List[Path]:
+    with open(path, encoding='utf-8', errors='surrogateescape') as file:
+        text = file.read()
+
+    # Join continuation lines
+    text = text.replace('\\\r\n', ' ').replace('\\\n', ' ')
+
+    # Only the first rule is relevant, the rest
+    # are empty phony rules for every header
+    rule = text.split('\n', 1)[0]
+
+    # Skip the target(s), the separator is the first
+    # colon followed by whitespace (so that `C:\...` works)
+    sep = rule.find(': ')
+    if sep == -1:
+        sep = rule.find(':\t')
+    if sep == -1:
+        if rule.rstrip().endswith(':'):
+            return []
+        sep = rule.find(':')
+    if sep == -1:
+        return []
+
+    deps = []
+    token = []
+    chars = iter(rule[sep + 1:])
+    for char in chars:
+        if char == '\\':
+            # Escaped space or backslash
+            nxt = next(chars, '')
+            if nxt in (' ', '#', '\\'):
+                token.append(nxt)
+            else:
+                token.append(char)
+                token.append(nxt)
+        elif char == '$':
+            # `$$` is an escaped dollar sign
+            nxt = next(chars, '')
+            token.append('$' if nxt == '$' else char + nxt)
+        elif char in (' ', '\t', '\r'):
+            if token:
+                deps.append(Path(''.join(token)))
+                token = []
+        else:
+            token.append(char)
+
+    if token:
+        deps.append(Path(''.join(token)))
+
+    return deps
@@ -1,9 +1,12 @@
 from pathlib import Path
-from typing import List
+from typing import Any, List, Union
 import errno
+import json
 import os
+import pickle
 import shutil
 import sys
+import threading
 
 from utils.logger import log
 
@@ -28,3 +31,68 @@ def delete_dir(file: Path):
         except BlockingIOError:
             log.error('File busy or being handled by another process: ', path=file)
             sys.exit(os.strerror(errno.EBUSY))
+
+
+# Parses a human readable size like '500M' or '5G' into bytes
+def parse_size(value) -> int:
+    if isinstance(value, int):
+        return value
+
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+    text = str(value).strip().upper().rstrip('B')
+
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+
+    return int(text)
+
+
+# Formats a size in bytes into a human readable string
+def format_size(size: int) -> str:
+    for unit in ('B', 'K', 'M', 'G'):
+        if size < 1024:
+            return f'{size:.1f}{unit}' if unit != 'B' else f'{size}{unit}'
+        size /= 1024
+
+    return f'{size:.1f}T'
+
+
+# Writes `data` through a temporary file next to `path`, so that
+# readers, other threads and other processes never see a partial
+# file. Creates missing parent directories. Raises `OSError`,
+# callers decide whether a failed write matters
+def write_atomic(path: Path, data: Union[bytes, str]):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(f'{path.name}.tmp{os.getpid()}-{threading.get_ident()}')
+
+    try:
+        temp.write_bytes(data)
+        os.replace(temp, path)
+    except OSError:
+        try:
+            temp.unlink()
+        except OSError:
+            pass
+        raise
+
+
+# Reads a pickled file, `None` if it's missing,
+# truncated or from an incompatible version
+def load_pickle(path: Path) -> Any:
+    try:
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+    except Exception:
+        return None
+
+
+# Reads a JSON file, `None` if it's missing or malformed
+def load_json(path: Path) -> Any:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
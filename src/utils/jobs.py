@@ -0,0 +1,320 @@
+from utils.logger import log
+from contextlib import contextmanager
+from typing import Optional, Tuple
+import os
+import select
+import threading
+
+
+class JobserverError(Exception):
+    # ========================================= #
+    # The jobserver can't hand out tokens       #
+    # ========================================= #
+    pass
+
+
+class JobLimiter(object):
+    # ========================================= #
+    # Limits how many processes run at once     #
+    # shared by everything spawning compilers   #
+    # or linkers, across all active profiles    #
+    # ========================================= #
+    def __init__(self, jobs: int):
+        self.jobs = max(1, jobs)
+        self.semaphore = threading.Semaphore(self.jobs)
+
+    # Block until a job slot is free           #
+    # ---------------------------------------- #
+    def acquire(self) -> Optional[bytes]:
+        self.semaphore.acquire()
+
+        return None
+
+    # Give a job slot back           #
+    # ------------------------------ #
+    def release(self, token: Optional[bytes] = None):
+        self.semaphore.release()
+
+    # Hold a job slot for the body of a `with` block           #
+    # -------------------------------------------------------- #
+    @contextmanager
+    def slot(self):
+        token = self.acquire()
+
+        try:
+            yield
+        finally:
+            self.release(token)
+
+    # File descriptors child processes need to inherit           #
+    # ---------------------------------------------------------- #
+    def get_pass_fds(self) -> Tuple[int, ...]:
+        return ()
+
+    # Release any resources held           #
+    # ------------------------------------ #
+    def close(self):
+        pass
+
+
+class JobserverClient(JobLimiter):
+    # ========================================= #
+    # Takes job slots from a GNU make           #
+    # jobserver, on top of the local limit      #
+    # The process owns one implicit slot,       #
+    # every other slot is a token read from     #
+    # the jobserver and written back after      #
+    # ========================================= #
+    def __init__(self, jobs: int, read_fd: int, write_fd: int, fifo: Optional[str] = None):
+        super().__init__(jobs)
+
+        self.read_fd = read_fd
+        self.write_fd = write_fd
+
+        # Named pipe jobservers (make 4.4+) are opened by path,
+        # children don't need to inherit anything
+        self.fifo = fifo
+
+        self.has_implicit = True
+        self.lock = threading.Lock()
+
+    # Take the implicit slot or read a token           #
+    # ------------------------------------------------ #
+    def acquire(self) -> Optional[bytes]:
+        super().acquire()
+
+        with self.lock:
+            if self.has_implicit:
+                self.has_implicit = False
+                return None
+
+        while True:
+            try:
+                token = os.read(self.read_fd, 1)
+                break
+            except BlockingIOError:
+                # make may hand the pipe down non-blocking, wait
+                # until a token shows up and race the others for it
+                select.select([self.read_fd], [], [])
+            except OSError as err:
+                super().release()
+                raise JobserverError(f'Failed to read jobserver token: {err}')
+
+        # Running on without a token would exceed the job limit
+        if not token:
+            super().release()
+            raise JobserverError('Jobserver closed its pipe')
+
+        return token
+
+    # Return the token, or the implicit slot           #
+    # ------------------------------------------------ #
+    def release(self, token: Optional[bytes] = None):
+        if token is None:
+            with self.lock:
+                self.has_implicit = True
+        else:
+            # Always hand back the same byte, make uses
+            # it to pass along the build's error state
+            try:
+                os.write(self.write_fd, token)
+            except OSError as err:
+                log.warning('Failed to return jobserver token', error=str(err))
+
+        super().release()
+
+    def get_pass_fds(self) -> Tuple[int, ...]:
+        if self.fifo is not None:
+            return ()
+
+        return (self.read_fd, self.write_fd)
+
+    def close(self):
+        if self.fifo is not None:
+            os.close(self.read_fd)
+
+
+class JobserverServer(JobserverClient):
+    # ========================================= #
+    # Top-level jobserver, nested tools like    #
+    # `-flto=jobserver` or a sub-make draw      #
+    # from the same `jobs` slots as py-build    #
+    # ========================================= #
+
+    # Pipes advertised by this process and the
+    # `MAKEFLAGS` each of them replaced
+    advertised = dict()
+
+    def __init__(self, jobs: int):
+        (read_fd, write_fd) = os.pipe()
+        super().__init__(jobs, read_fd, write_fd)
+
+        # The implicit slot is ours, the rest go in the pipe
+        os.write(self.write_fd, b'+' * (self.jobs - 1))
+
+        # Advertise the jobserver to child processes
+        self.makeflags = os.environ.get('MAKEFLAGS')
+        os.environ['MAKEFLAGS'] = f'{self.makeflags or ""} -j{self.jobs} --jobserver-auth={read_fd},{write_fd}'.strip()
+
+        JobserverServer.advertised[(read_fd, write_fd)] = self.makeflags
+
+    def close(self):
+        JobserverServer.advertised.pop((self.read_fd, self.write_fd), None)
+
+        if self.makeflags is None:
+            os.environ.pop('MAKEFLAGS', None)
+        else:
+            os.environ['MAKEFLAGS'] = self.makeflags
+
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+
+# Find the jobserver in `MAKEFLAGS`, the last one wins
+# Returns the pipe file descriptors or the named pipe path
+def parse_jobserver_auth(makeflags: str) -> Optional[Tuple[int, int, Optional[str]]]:
+    auth = None
+
+    for flag in makeflags.split():
+        # `--jobserver-fds` is used by make before 4.2
+        for prefix in ('--jobserver-auth=', '--jobserver-fds='):
+            if flag.startswith(prefix):
+                auth = flag[len(prefix):]
+
+    if auth is None:
+        return None
+
+    if auth.startswith('fifo:'):
+        return (-1, -1, auth[len('fifo:'):])
+
+    try:
+        (read_fd, write_fd) = (int(fd) for fd in auth.split(','))
+    except ValueError:
+        return None
+
+    return (read_fd, write_fd, None)
+
+
+# Create the job limiter for this process: a client if make
+# passed a jobserver down, otherwise a jobserver of our own.
+# Meant to be called once, builders share the result
+def create_limiter(jobs: int) -> JobLimiter:
+    auth = parse_jobserver_auth(os.environ.get('MAKEFLAGS', ''))
+
+    # Our own jobserver isn't a parent make, look
+    # at what was there before it was advertised
+    while auth is not None and auth[:2] in JobserverServer.advertised:
+        auth = parse_jobserver_auth(JobserverServer.advertised[auth[:2]] or '')
+
+    if auth is not None:
+        (read_fd, write_fd, fifo) = auth
+
+        try:
+            if fifo is not None:
+                read_fd = write_fd = os.open(fifo, os.O_RDWR)
+            else:
+                # make only passes the pipe to recipes marked with '+'
+                os.fstat(read_fd)
+                os.fstat(write_fd)
+        except OSError:
+            log.warning('Jobserver in MAKEFLAGS is not accessible, mark the recipe with \'+\'')
+            return JobLimiter(jobs)
+
+        log.debug('Using make jobserver', auth=fifo or f'{read_fd},{write_fd}')
+        return JobserverClient(jobs, read_fd, write_fd, fifo)
+
+    if not hasattr(os, 'pipe') or os.name == 'nt':
+        return JobLimiter(jobs)
+
+    return JobserverServer(jobs)
+
+
+class MemoryBudget(object):
+    # ========================================= #
+    # Admits jobs while their predicted peak    #
+    # memory fits into the budget, shared by    #
+    # all profiles building at the same time    #
+    # ========================================= #
+    def __init__(self, budget: Optional[int]):
+        # `None` admits everything
+        self.budget = budget
+
+        # Memory reserved by running jobs
+        self.used = 0
+        self.running = 0
+
+        self.condition = threading.Condition()
+
+    # Whether a job needing `amount` bytes may start           #
+    # a job always runs if nothing else is, even if it         #
+    # needs more than the whole budget                         #
+    # -------------------------------------------------------- #
+    def fits(self, amount: int) -> bool:
+        if self.budget is None or self.running == 0:
+            return True
+
+        return self.used + amount <= self.budget
+
+    # Reserve memory for a job, the condition must be held           #
+    # -------------------------------------------------------------- #
+    def reserve(self, amount: int):
+        self.used += amount
+        self.running += 1
+
+    # Return the memory of a finished job           #
+    # --------------------------------------------- #
+    def release(self, amount: int):
+        with self.condition:
+            self.used -= amount
+            self.running -= 1
+            self.condition.notify_all()
+
+
+class AdmissionQueue(object):
+    # ========================================= #
+    # Pending jobs in priority order, handed    #
+    # out as the memory budget allows. A job    #
+    # that doesn't fit is skipped for a later   #
+    # lighter one instead of idling a worker    #
+    # ========================================= #
+    def __init__(self, items: list, costs: dict, memory: MemoryBudget):
+        self.items = list(items)
+        self.costs = costs
+        self.memory = memory
+
+    # Take the first job that fits, waiting for running           #
+    # ones to finish if none does. `None` once empty              #
+    # ----------------------------------------------------------- #
+    def take(self):
+        with self.memory.condition:
+            while self.items:
+                for (index, item) in enumerate(self.items):
+                    if self.memory.fits(self.costs[item]):
+                        del self.items[index]
+                        self.memory.reserve(self.costs[item])
+                        return item
+
+                self.memory.condition.wait()
+
+        return None
+
+    # Mark a job taken from the queue as finished           #
+    # ----------------------------------------------------- #
+    def done(self, item):
+        self.memory.release(self.costs[item])
+
+
+# Memory available to new processes in bytes, `None` if unknown
+def get_available_memory() -> Optional[int]:
+    try:
+        with open('/proc/meminfo') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, OSError, ValueError):
+        return None
@@ -1,3 +1,26 @@
-from structlog import get_logger # type: ignore
+class LazyLogger(object):
+    # ========================================= #
+    # Defers importing structlog (and           #
+    # everything it pulls in) until the         #
+    # first message is actually logged          #
+    # ========================================= #
+    def __init__(self):
+        self.logger = None
 
-log = get_logger()
+    # Import structlog and create the logger           #
+    # ------------------------------------------------ #
+    def load(self):
+        if self.logger is None:
+            from structlog import get_logger  # type: ignore
+
+            self.logger = get_logger()
+
+        return self.logger
+
+    # Forward `log.info(...)` and friends           #
+    # --------------------------------------------- #
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+log = LazyLogger()
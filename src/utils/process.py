@@ -0,0 +1,134 @@
+from typing import Callable, List, Optional, Tuple
+import os
+import signal
+import subprocess as sp
+import sys
+import threading
+import time
+
+
+class ProcessResult(sp.CompletedProcess):
+    # ========================================= #
+    # Completed process with resource usage     #
+    # of the child process                      #
+    # ========================================= #
+    def __init__(self, args, returncode: int, stdout=b'', stderr=b'', wall: float = 0.0, cpu: float = 0.0, max_rss: int = 0):
+        super().__init__(args, returncode, stdout, stderr)
+
+        # Wall and CPU (user + system) time in seconds
+        self.wall = wall
+        self.cpu = cpu
+
+        # Peak resident set size in bytes
+        self.max_rss = max_rss
+
+        # Whether the output was already shown while running
+        self.streamed = False
+
+
+class ProcessSet(object):
+    # ========================================= #
+    # Running processes of a build, killed      #
+    # all at once when the build is cancelled   #
+    # ========================================= #
+    def __init__(self):
+        self.processes = set()
+        self.lock = threading.Lock()
+        self.is_cancelled = False
+
+    # Track a started process, returns False           #
+    # if the build got cancelled in the meantime       #
+    # ------------------------------------------------ #
+    def add(self, process: sp.Popen) -> bool:
+        with self.lock:
+            if self.is_cancelled:
+                return False
+
+            self.processes.add(process)
+            return True
+
+    def remove(self, process: sp.Popen):
+        with self.lock:
+            self.processes.discard(process)
+
+    # Kill every running process, nothing new starts after this           #
+    # ------------------------------------------------------------------- #
+    def cancel(self):
+        with self.lock:
+            self.is_cancelled = True
+
+            for process in self.processes:
+                kill_process(process)
+
+
+# Kills a child without `Popen.kill`, which may reap it
+# through `poll` and leave nothing for `wait4`
+def kill_process(process: sp.Popen):
+    try:
+        os.kill(process.pid, getattr(signal, 'SIGKILL', signal.SIGTERM))
+    except OSError:
+        pass
+
+
+# Convert a wait status into a return code like `Popen.returncode`
+def get_exit_code(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+
+    return os.WEXITSTATUS(status)
+
+
+# Runs a command capturing its output (stdout and stderr combined)
+# and its resource usage. Uses `wait4` where available, since
+# `getrusage(RUSAGE_CHILDREN)` can't tell concurrent children apart.
+# `pass_fds` are kept open in the child, e.g. the jobserver pipe.
+# `on_line` gets every output line as soon as the child writes it,
+# the whole output is still returned. Processes are tracked
+# in `processes` so that a failing build can kill them.
+# `cwd` is where the child runs, the current directory by default
+def run_process(cmd: List[str], pass_fds: Tuple[int, ...] = (),
+                on_line: Optional[Callable[[bytes], None]] = None,
+                processes: Optional[ProcessSet] = None,
+                cwd: Optional[str] = None) -> ProcessResult:
+    start = time.perf_counter()
+
+    process = sp.Popen(cmd, stdin=sp.DEVNULL, stdout=sp.PIPE, stderr=sp.STDOUT, pass_fds=pass_fds, cwd=cwd)
+
+    if processes is not None and not processes.add(process):
+        kill_process(process)
+
+    try:
+        with process.stdout:
+            if on_line is None:
+                output = process.stdout.read()
+            else:
+                lines = []
+                for line in process.stdout:
+                    lines.append(line)
+                    on_line(line)
+
+                output = b''.join(lines)
+    finally:
+        if processes is not None:
+            processes.remove(process)
+
+    if not hasattr(os, 'wait4'):
+        process.wait()
+        result = ProcessResult(cmd, process.returncode, b'', output, wall=time.perf_counter() - start)
+    else:
+        # Reap the child ourselves to get its rusage
+        (_, status, rusage) = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+
+        # Let `Popen` know the child is gone
+        process.returncode = get_exit_code(status)
+
+        # Linux reports KiB, macOS reports bytes
+        max_rss = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+        cpu = rusage.ru_utime + rusage.ru_stime
+
+        result = ProcessResult(cmd, process.returncode, b'', output, wall=wall, cpu=cpu, max_rss=max_rss)
+
+    result.streamed = on_line is not None
+
+    return result
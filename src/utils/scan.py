@@ -0,0 +1,111 @@
+from pathlib import Path
+from typing import Dict, List, Tuple
+import os
+import pickle
+import time
+
+from utils.file import load_pickle, write_atomic
+from utils.logger import log
+
+# Directories modified this recently aren't trusted,
+# a file created within the same mtime tick would go unnoticed
+RACY_WINDOW_NS = 2 * 10**9
+
+
+class DirectoryIndex(object):
+    # ========================================= #
+    # Cached listing of directory trees         #
+    # each directory is only re-read when       #
+    # its mtime changed since the last scan     #
+    # ========================================= #
+    def __init__(self, path: Path):
+        self.path = path
+
+        # Directory -> (mtime_ns, file names, subdirectory names)
+        self.entries: Dict[str, Tuple[int, List[str], List[str]]] = self.load()
+
+        # Directories seen during this run, everything
+        # else gets dropped from the index when saving
+        self.visited = set()
+
+        # Number of directories actually read during this run
+        self.rescanned = 0
+
+    # Read the index from disk           #
+    # ---------------------------------- #
+    def load(self) -> dict:
+        entries = load_pickle(self.path)
+
+        return entries if isinstance(entries, dict) else dict()
+
+    # List a single directory, from the index if possible           #
+    # ------------------------------------------------------------- #
+    def list_dir(self, path: str) -> Tuple[List[str], List[str]]:
+        mtime = os.stat(path).st_mtime_ns
+        self.visited.add(path)
+
+        cached = self.entries.get(path)
+        if cached is not None and cached[0] == mtime:
+            return (cached[1], cached[2])
+
+        files = []
+        subdirs = []
+
+        with os.scandir(path) as entries:
+            for entry in entries:
+                # Symlinked directories aren't followed
+                # to avoid cycles, same as `os.walk`
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+
+        # Don't cache directories still being written to
+        if time.time_ns() - mtime < RACY_WINDOW_NS:
+            mtime = -1
+
+        self.entries[path] = (mtime, files, subdirs)
+        self.rescanned += 1
+
+        return (files, subdirs)
+
+    # Return all files below `root`           #
+    # paths are relative to `root`            #
+    # --------------------------------------- #
+    def scan(self, root: Path) -> List[str]:
+        result = []
+        stack = [('', str(root))]
+
+        while stack:
+            (rel_dir, path) = stack.pop()
+
+            try:
+                (files, subdirs) = self.list_dir(path)
+            except OSError:
+                continue
+
+            for name in files:
+                result.append(f'{rel_dir}{name}')
+
+            for name in subdirs:
+                stack.append((f'{rel_dir}{name}/', os.path.join(path, name)))
+
+        result.sort()
+
+        return result
+
+    # Write the index back if anything changed           #
+    # -------------------------------------------------- #
+    def save(self):
+        stale = set(self.entries) - self.visited
+
+        if not self.rescanned and not stale:
+            return
+
+        for path in stale:
+            del self.entries[path]
+
+        try:
+            write_atomic(self.path, pickle.dumps(self.entries, protocol=pickle.HIGHEST_PROTOCOL))
+        except OSError as err:
+            log.warning('Failed to save directory index', error=str(err))
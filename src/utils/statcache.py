@@ -0,0 +1,137 @@
+from pathlib import Path
+from typing import Dict, List, Tuple
+from hashlib import blake2b
+import json
+import os
+import pickle
+import threading
+import time
+
+from utils.file import load_json, load_pickle, write_atomic
+from utils.logger import log
+from utils.scan import RACY_WINDOW_NS
+
+# Files are hashed in chunks of this size
+CHUNK_SIZE = 1 << 20
+
+
+class StatCache(object):
+    # ========================================= #
+    # Content hashes of files, memoized by      #
+    # inode, size and mtime so that files are   #
+    # only read again once they changed         #
+    # ========================================= #
+    def __init__(self, path: Path):
+        self.path = path
+
+        # File -> (inode, size, mtime_ns, hash)
+        self.entries: Dict[str, Tuple[int, int, int, str]] = self.load()
+
+        # Number of files actually read during this run
+        self.hashed = 0
+        self.is_dirty = False
+
+        # Compile workers record hashes concurrently
+        self.lock = threading.Lock()
+
+    # Read the cache from disk           #
+    # ---------------------------------- #
+    def load(self) -> dict:
+        entries = load_pickle(self.path)
+
+        return entries if isinstance(entries, dict) else dict()
+
+    # Hash the contents of a file           #
+    # ------------------------------------- #
+    def hash_file(self, path: str) -> str:
+        digest = blake2b(digest_size=16)
+
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+
+        return digest.hexdigest()
+
+    # Content hash of a file, read only if its           #
+    # inode, size or mtime changed since last time       #
+    # Raises `OSError` if the file is gone               #
+    # -------------------------------------------------- #
+    def get_hash(self, path: Path) -> str:
+        key = str(path)
+
+        try:
+            st = os.stat(key)
+        except OSError:
+            with self.lock:
+                if self.entries.pop(key, None) is not None:
+                    self.is_dirty = True
+            raise
+
+        stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+
+        cached = self.entries.get(key)
+        if cached is not None and cached[:3] == stamp:
+            return cached[3]
+
+        digest = self.hash_file(key)
+
+        with self.lock:
+            self.hashed += 1
+
+            # A file written within the same mtime tick
+            # would keep its stamp, don't trust it yet
+            if time.time_ns() - st.st_mtime_ns >= RACY_WINDOW_NS:
+                self.entries[key] = stamp + (digest,)
+                self.is_dirty = True
+
+        return digest
+
+    # Write the content hashes of `inputs` to a record file           #
+    # --------------------------------------------------------------- #
+    def save_record(self, record: Path, inputs: List[Path]):
+        try:
+            hashes = {str(path): self.get_hash(path) for path in inputs}
+        except OSError:
+            # An input went away, the next build starts over
+            hashes = dict()
+
+        try:
+            record.write_text(json.dumps(hashes))
+        except OSError as err:
+            log.warning('Failed to save input hashes', path=str(record), error=str(err))
+
+    # Whether `paths` still have the contents             #
+    # they had when the record was written                #
+    # --------------------------------------------------- #
+    def is_unchanged(self, record: Path, paths: List[Path]) -> bool:
+        hashes = load_json(record)
+        if not isinstance(hashes, dict):
+            return False
+
+        for path in paths:
+            expected = hashes.get(str(path))
+            if expected is None:
+                return False
+
+            try:
+                if self.get_hash(path) != expected:
+                    return False
+            except OSError:
+                return False
+
+        return True
+
+    # Write the cache back if anything changed           #
+    # -------------------------------------------------- #
+    def save(self):
+        with self.lock:
+            if not self.is_dirty:
+                return
+
+            try:
+                write_atomic(self.path, pickle.dumps(self.entries, protocol=pickle.HIGHEST_PROTOCOL))
+            except OSError as err:
+                log.warning('Failed to save stat cache', error=str(err))
+                return
+
+            self.is_dirty = False
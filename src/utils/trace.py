@@ -0,0 +1,100 @@
+from contextlib import contextmanager
+from pathlib import Path
+import json
+import os
+import threading
+import time
+
+
+class Tracer(object):
+    # ========================================= #
+    # Records timed build phases and writes     #
+    # them in Chrome trace-event format         #
+    # (chrome://tracing, ui.perfetto.dev)       #
+    # ========================================= #
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.events = []
+        self.lock = threading.Lock()
+
+        # Thread ident -> track id, every worker
+        # thread gets its own track in the viewer
+        self.tracks = dict()
+
+    # Drop all recorded events and restart the clock           #
+    # -------------------------------------------------------- #
+    def reset(self):
+        with self.lock:
+            self.start = time.perf_counter()
+            self.events = []
+            self.tracks = dict()
+
+    # Track id of the calling thread           #
+    # ---------------------------------------- #
+    def get_track(self) -> int:
+        ident = threading.get_ident()
+
+        with self.lock:
+            track = self.tracks.get(ident)
+
+            if track is None:
+                track = len(self.tracks)
+                self.tracks[ident] = track
+
+                name = 'main' if threading.current_thread() is threading.main_thread() else f'worker {track}'
+                self.events.append({
+                    'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': track,
+                    'args': {'name': name},
+                })
+
+        return track
+
+    # Record a finished phase           #
+    # `begin` is a `perf_counter` value #
+    # --------------------------------- #
+    def add(self, name: str, category: str, begin: float, duration: float, **args):
+        track = self.get_track()
+
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': (begin - self.start) * 1e6,
+            'dur': duration * 1e6,
+            'pid': os.getpid(),
+            'tid': track,
+            'args': args,
+        }
+
+        with self.lock:
+            self.events.append(event)
+
+    # Time the body of a `with` block           #
+    # ----------------------------------------- #
+    @contextmanager
+    def span(self, name: str, category: str, **args):
+        begin = time.perf_counter()
+
+        try:
+            yield args
+        finally:
+            self.add(name, category, begin, time.perf_counter() - begin, **args)
+
+    # All recorded phases of a category           #
+    # ------------------------------------------- #
+    def get_events(self, category: str) -> list:
+        with self.lock:
+            return [event for event in self.events if event.get('cat') == category]
+
+    # Write all events as a trace-event JSON file           #
+    # ----------------------------------------------------- #
+    def write(self, path: Path):
+        with self.lock:
+            data = {'traceEvents': list(self.events), 'displayTimeUnit': 'ms'}
+
+        with open(path, 'w') as file:
+            json.dump(data, file)
+
+
+# Global tracer shared by the whole build
+tracer = Tracer()
@@ -0,0 +1,235 @@
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from utils.logger import log
+
+# inotify(7) event masks
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_ISDIR = 0x40000000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+# struct inotify_event { int wd; uint32_t mask, cookie, len; char name[]; }
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class Watcher(object):
+    # ======================================== #
+    # Watches directory trees for changes      #
+    # using inotify where available,           #
+    # falling back to polling mtimes           #
+    # ======================================== #
+    def __init__(self, dirs: List[Path], files: List[Path] = None, debounce: float = 0.1, interval: float = 0.5):
+        # Directories watched recursively
+        self.dirs = [path for path in dirs if path.is_dir()]
+
+        # Single files watched through their parent directory
+        self.files = set(files or [])
+
+        # Quiet period that ends a burst of events
+        self.debounce = debounce
+
+        # Polling interval for the fallback mode
+        self.interval = interval
+
+        self.inotify = None
+        self.fd = -1
+        self.watches: Dict[int, Path] = dict()
+
+        # Polling snapshot: path -> (mtime_ns, size)
+        self.snapshot: Dict[Path, Tuple[int, int]] = dict()
+
+        if not self.setup_inotify():
+            log.info('inotify unavailable, polling for changes', interval=interval)
+            self.snapshot = self.take_snapshot()
+
+    # Initialize inotify and watch every directory           #
+    # ------------------------------------------------------ #
+    def setup_inotify(self) -> bool:
+        if not sys.platform.startswith('linux'):
+            return False
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return False
+
+        if fd < 0:
+            return False
+
+        self.inotify = libc
+        self.fd = fd
+
+        for path in self.dirs:
+            self.add_tree(path)
+
+        for path in self.files:
+            self.add_watch(path.parent)
+
+        return True
+
+    # Add a single inotify watch           #
+    # ------------------------------------ #
+    def add_watch(self, path: Path):
+        wd = self.inotify.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+
+        if wd < 0:
+            err = ctypes.get_errno()
+            log.warning('Failed to watch directory', path=str(path), error=os.strerror(err))
+            return
+
+        self.watches[wd] = path
+
+    # inotify isn't recursive, watch every subdirectory           #
+    # ----------------------------------------------------------- #
+    def add_tree(self, root: Path):
+        self.add_watch(root)
+
+        for (dirpath, dirnames, _) in os.walk(root):
+            for name in dirnames:
+                self.add_watch(Path(dirpath) / name)
+
+    # Read pending events, returns changed paths           #
+    # ---------------------------------------------------- #
+    def read_events(self) -> Set[Path]:
+        changed = set()
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            (wd, mask, _, length) = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+
+            parent = self.watches.get(wd)
+            if parent is None:
+                continue
+
+            path = parent / os.fsdecode(name) if name else parent
+
+            # Only the listed files matter
+            # in non-recursively watched directories
+            if not any(parent == d or d in parent.parents for d in self.dirs):
+                if path not in self.files:
+                    continue
+
+            # Start watching newly created directories
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self.add_tree(path)
+
+            changed.add(path)
+
+        return changed
+
+    # Stat every file of the watched trees           #
+    # ---------------------------------------------- #
+    def take_snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot = dict()
+        stack = [str(path) for path in self.dirs]
+
+        while stack:
+            try:
+                entries = os.scandir(stack.pop())
+            except OSError:
+                continue
+
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+
+                    snapshot[Path(entry.path)] = (stat.st_mtime_ns, stat.st_size)
+
+        for path in self.files:
+            try:
+                stat = path.stat()
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                pass
+
+        return snapshot
+
+    # Compare a new snapshot against the previous one           #
+    # --------------------------------------------------------- #
+    def poll(self) -> Set[Path]:
+        snapshot = self.take_snapshot()
+
+        changed = set(snapshot.items()) ^ set(self.snapshot.items())
+        self.snapshot = snapshot
+
+        return {path for (path, _) in changed}
+
+    # Block until something changes and return           #
+    # every path changed during the burst                #
+    # -------------------------------------------------- #
+    def wait(self) -> Set[Path]:
+        changed = set()
+
+        if self.inotify is None:
+            # Wait for the first change, then keep polling
+            # until a poll comes back empty
+            while not changed:
+                time.sleep(self.interval)
+                changed = self.poll()
+
+            while True:
+                time.sleep(self.debounce)
+                burst = self.poll()
+
+                if not burst:
+                    return changed
+
+                changed |= burst
+
+        while True:
+            # Wait indefinitely for the first event,
+            # afterwards only for the debounce period
+            timeout = self.debounce if changed else None
+            (ready, _, _) = select.select([self.fd], [], [], timeout)
+
+            if not ready:
+                if changed:
+                    return changed
+                continue
+
+            changed |= self.read_events()
+
+    # Stop watching           #
+    # ----------------------- #
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
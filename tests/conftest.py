@@ -0,0 +1,56 @@
+from pathlib import Path
+import sys
+
+import pytest
+
+# Modules live in 'src' and import each other as top-level packages
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+
+CONFIG = '''
+project:
+  name: {name}
+  authors: []
+  version: 0.1.0
+  language: c
+  dirs:
+    target: target
+    build: build
+    include: include
+    source: src
+    deps: vendor
+  setup:
+    files:
+      sources: {sources}
+      include: []
+    type: exe
+    compiler: gcc
+    profiles:
+{profiles}
+    cache:
+      enabled: false
+dependencies: {{}}
+'''
+
+
+# Writes a project config next to a shared source tree
+# and returns a function creating builders for it
+@pytest.fixture
+def make_builder(tmp_path, monkeypatch):
+    from config.builder import Builder
+
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+
+    for name in ('src', 'include', 'vendor'):
+        (tmp_path / name).mkdir(exist_ok=True)
+
+    def make(config: str, name: str, sources: list, profiles: dict) -> Builder:
+        for source in sources:
+            (tmp_path / 'src' / source).write_text('int x;\n')
+
+        profile_lines = '\n'.join(f'      {profile}: {flags}' for profile, flags in profiles.items())
+        path = tmp_path / config
+        path.write_text(CONFIG.format(name=name, sources=sources, profiles=profile_lines))
+
+        return Builder(path)
+
+    return make
@@ -0,0 +1,38 @@
+from pathlib import Path
+
+from utils.depfile import parse_depfile
+
+
+def write(tmp_path, text: str) -> Path:
+    path = tmp_path / 'file.d'
+    path.write_bytes(text.encode('utf-8'))
+    return path
+
+
+def test_continuation_lines(tmp_path):
+    path = write(tmp_path, 'obj.o: src/a.c \\\n include/a.h \\\r\n include/b.h\n')
+
+    assert parse_depfile(path) == [Path('src/a.c'), Path('include/a.h'), Path('include/b.h')]
+
+
+def test_phony_rules_are_ignored(tmp_path):
+    path = write(tmp_path, 'obj.o: a.c a.h\n\na.h:\n')
+
+    assert parse_depfile(path) == [Path('a.c'), Path('a.h')]
+
+
+def test_escapes(tmp_path):
+    path = write(tmp_path, 'obj.o: my\\ file.c cost$$.h hash\\#.h\n')
+
+    assert parse_depfile(path) == [Path('my file.c'), Path('cost$.h'), Path('hash#.h')]
+
+
+def test_drive_letters(tmp_path):
+    path = write(tmp_path, 'C:/build/obj.o: C:/src/a.c C:/include/a.h\n')
+
+    assert parse_depfile(path) == [Path('C:/src/a.c'), Path('C:/include/a.h')]
+
+
+def test_no_prerequisites(tmp_path):
+    assert parse_depfile(write(tmp_path, 'obj.o:\n')) == []
+    assert parse_depfile(write(tmp_path, '')) == []
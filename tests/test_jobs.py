@@ -0,0 +1,95 @@
+import os
+import threading
+
+import pytest
+
+from utils.jobs import (
+    AdmissionQueue, JobserverClient, JobserverError, JobserverServer,
+    MemoryBudget, create_limiter, parse_jobserver_auth,
+)
+
+
+def test_jobserver_auth():
+    assert parse_jobserver_auth('-j8 --jobserver-auth=3,4') == (3, 4, None)
+    assert parse_jobserver_auth('-j8 --jobserver-fds=5,6') == (5, 6, None)
+    assert parse_jobserver_auth('-j8 --jobserver-auth=fifo:/tmp/js') == (-1, -1, '/tmp/js')
+
+
+def test_jobserver_auth_last_wins():
+    assert parse_jobserver_auth('--jobserver-fds=3,4 --jobserver-auth=7,8') == (7, 8, None)
+
+
+def test_jobserver_auth_missing_or_invalid():
+    assert parse_jobserver_auth('') is None
+    assert parse_jobserver_auth('-j8 -k') is None
+    assert parse_jobserver_auth('--jobserver-auth=3') is None
+    assert parse_jobserver_auth('--jobserver-auth=a,b') is None
+
+
+def test_admission_skips_jobs_that_dont_fit():
+    costs = {'big': 80, 'medium': 50, 'small': 10}
+    queue = AdmissionQueue(['big', 'medium', 'small'], costs, MemoryBudget(100))
+
+    assert queue.take() == 'big'
+    assert queue.take() == 'small'
+
+    queue.done('big')
+    assert queue.take() == 'medium'
+
+    queue.done('small')
+    queue.done('medium')
+    assert queue.take() is None
+
+
+def test_admission_runs_oversized_jobs_alone():
+    queue = AdmissionQueue(['huge', 'small'], {'huge': 500, 'small': 10}, MemoryBudget(100))
+
+    assert queue.take() == 'huge'
+
+    # Anything else waits for the oversized job
+    taken = []
+    thread = threading.Thread(target=lambda: taken.append(queue.take()))
+    thread.start()
+    thread.join(0.1)
+    assert taken == []
+
+    queue.done('huge')
+    thread.join(5)
+    assert taken == ['small']
+
+
+def test_admission_without_budget():
+    queue = AdmissionQueue(['a', 'b'], {'a': 10**12, 'b': 10**12}, MemoryBudget(None))
+
+    assert [queue.take(), queue.take(), queue.take()] == ['a', 'b', None]
+
+
+def test_own_jobserver_is_not_a_parent(monkeypatch):
+    monkeypatch.setenv('MAKEFLAGS', '-k')
+
+    first = create_limiter(2)
+    second = create_limiter(2)
+
+    try:
+        assert isinstance(second, JobserverServer)
+        assert (second.read_fd, second.write_fd) != (first.read_fd, first.write_fd)
+    finally:
+        second.close()
+        first.close()
+
+    assert os.environ['MAKEFLAGS'] == '-k'
+
+
+def test_closed_jobserver_raises():
+    (read_fd, write_fd) = os.pipe()
+    os.close(write_fd)
+
+    client = JobserverClient(4, read_fd, read_fd)
+
+    try:
+        # The implicit slot needs no token
+        with client.slot():
+            with pytest.raises(JobserverError):
+                client.acquire()
+    finally:
+        os.close(read_fd)
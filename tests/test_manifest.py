@@ -0,0 +1,131 @@
+from pathlib import Path
+
+from config.manifest import BuildManifest
+
+
+def record_build(builder, profile: str) -> dict:
+    # Record what a build of `profile` would have produced
+    target = builder.for_profile(profile)
+    obj_dir = target.get_object_dir()
+    obj_dir.mkdir(parents=True, exist_ok=True)
+
+    outputs = {'dir': obj_dir}
+    builder.manifest.add(obj_dir, 'dir', profile)
+
+    for source in target.build_files['sources']:
+        obj = obj_dir / (Path(source).stem + '.o')
+        obj.write_text('object')
+        obj.with_suffix('.d').write_text('depfile')
+
+        outputs[Path(source).name] = obj
+        builder.manifest.add(obj, 'object', profile, input=source, files=[obj.with_suffix('.d')])
+
+    for output in target.get_output_paths():
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text('binary')
+
+        outputs['output'] = output
+        builder.manifest.add(output, 'output', profile)
+
+    builder.manifest.save()
+    return outputs
+
+
+def get_stale(builder) -> dict:
+    profiles = {profile: builder.for_profile(profile) for profile in builder.profiles}
+    sources = {str(source) for source in builder.build_files['sources']}
+
+    return {
+        output: builder.get_stale_reason(output, entry, profiles, sources)
+        for (output, entry) in builder.manifest.get_entries().items()
+    }
+
+
+def test_manifest_round_trip(tmp_path):
+    manifest = BuildManifest(tmp_path / 'manifest.json')
+    manifest.add(tmp_path / 'a.o', 'object', 'debug', input=tmp_path / 'a.c', files=[tmp_path / 'a.d'])
+    manifest.save()
+
+    entries = BuildManifest(tmp_path / 'manifest.json').get_entries()
+
+    assert entries == {
+        str(tmp_path / 'a.o'): {
+            'kind': 'object',
+            'profile': 'debug',
+            'input': str(tmp_path / 'a.c'),
+            'files': [str(tmp_path / 'a.d')],
+        }
+    }
+
+
+def test_nothing_stale_after_build(make_builder):
+    builder = make_builder('build.yaml', 'app', ['a.c', 'b.c'], {'debug': ['-O0']})
+    record_build(builder, 'debug')
+
+    assert set(get_stale(builder).values()) == {None}
+
+
+def test_removed_source(make_builder):
+    builder = make_builder('build.yaml', 'app', ['a.c', 'b.c'], {'debug': ['-O0']})
+    outputs = record_build(builder, 'debug')
+
+    builder = make_builder('build.yaml', 'app', ['a.c'], {'debug': ['-O0']})
+    stale = get_stale(builder)
+
+    assert stale[str(outputs['b.c'])] == 'source removed'
+    assert stale[str(outputs['a.c'])] is None
+
+
+def test_changed_flags_and_profiles(make_builder):
+    builder = make_builder('build.yaml', 'app', ['a.c'], {'debug': ['-O0'], 'release': ['-O2']})
+    debug = record_build(builder, 'debug')
+    release = record_build(builder, 'release')
+
+    builder = make_builder('build.yaml', 'app', ['a.c'], {'debug': ['-O1']})
+    stale = get_stale(builder)
+
+    assert stale[str(debug['dir'])] == 'flags changed'
+    assert stale[str(debug['a.c'])] == 'flags changed'
+    assert stale[str(release['dir'])] == 'profile removed'
+
+
+def test_renamed_output(make_builder):
+    builder = make_builder('build.yaml', 'app', ['a.c'], {'debug': ['-O0']})
+    outputs = record_build(builder, 'debug')
+
+    builder = make_builder('build.yaml', 'renamed', ['a.c'], {'debug': ['-O0']})
+
+    assert get_stale(builder)[str(outputs['output'])] == 'output renamed'
+
+
+def test_configs_sharing_build_dir(make_builder):
+    app = make_builder('build.yaml', 'app', ['a.c'], {'debug': ['-O0']})
+    tool = make_builder('tool.yaml', 'tool', ['b.c'], {'debug': ['-O2']})
+
+    assert app.manifest.path != tool.manifest.path
+
+    app_outputs = record_build(app, 'debug')
+    tool_outputs = record_build(tool, 'debug')
+
+    # Neither config sees the other's outputs as its own
+    assert set(get_stale(app).values()) == {None}
+    assert set(get_stale(tool).values()) == {None}
+
+    app.collect_garbage()
+    tool.collect_garbage()
+
+    for path in list(app_outputs.values()) + list(tool_outputs.values()):
+        assert path.exists()
+
+
+def test_gc_removes_stale_outputs(make_builder):
+    builder = make_builder('build.yaml', 'app', ['a.c', 'b.c'], {'debug': ['-O0']})
+    outputs = record_build(builder, 'debug')
+
+    builder = make_builder('build.yaml', 'app', ['a.c'], {'debug': ['-O0']})
+    builder.collect_garbage()
+
+    assert not outputs['b.c'].exists()
+    assert not outputs['b.c'].with_suffix('.d').exists()
+    assert outputs['a.c'].exists()
+    assert str(outputs['b.c']) not in BuildManifest(builder.manifest.path).get_entries()
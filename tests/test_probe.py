@@ -0,0 +1,36 @@
+from config.probe import LinkerProbe
+
+# Compiler driver only accepting '-fuse-ld=gold'
+COMPILER = '''#!/bin/sh
+echo "$@" >> "$0.log"
+[ "$1" = "-fuse-ld=gold" ]
+'''
+
+
+def make_compiler(tmp_path):
+    path = tmp_path / 'cc'
+    path.write_text(COMPILER)
+    path.chmod(0o755)
+
+    return path
+
+
+def test_linker_probe(tmp_path):
+    compiler = [str(make_compiler(tmp_path))]
+    probe = LinkerProbe(tmp_path / 'linkers.probe')
+
+    assert not probe.is_supported(compiler, 'mold', ())
+    assert probe.is_supported(compiler, 'gold', ())
+
+
+def test_linker_probe_is_cached(tmp_path):
+    compiler = [str(make_compiler(tmp_path))]
+    probe = LinkerProbe(tmp_path / 'linkers.probe')
+
+    assert not probe.is_supported(compiler, 'mold', ())
+    probe.save()
+
+    # Loaded from disk, the compiler isn't run again
+    probe = LinkerProbe(tmp_path / 'linkers.probe')
+    assert not probe.is_supported(compiler, 'mold', ())
+    assert len((tmp_path / 'cc.log').read_text().splitlines()) == 1
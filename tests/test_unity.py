@@ -0,0 +1,49 @@
+from pathlib import Path
+
+from config.unity import UnityBuild
+
+
+def make_batcher(tmp_path, batch_size: int = 4) -> UnityBuild:
+    return UnityBuild(tmp_path / 'src', tmp_path / 'unity', batch_size, exclude=[], extension='.c')
+
+
+def make_sources(tmp_path, count: int) -> list:
+    return [tmp_path / 'src' / f'file{index}.c' for index in range(count)]
+
+
+def test_batches_ignore_source_order(tmp_path):
+    batcher = make_batcher(tmp_path)
+    sources = make_sources(tmp_path, 13)
+
+    assert batcher.get_batches(sources) == batcher.get_batches(list(reversed(sources)))
+
+
+def test_batches_cover_every_source_once(tmp_path):
+    batcher = make_batcher(tmp_path)
+    sources = make_sources(tmp_path, 13)
+
+    members = [source for batch in batcher.get_batches(sources).values() for source in batch]
+
+    assert sorted(members) == sorted(sources)
+    assert all(len(batch) <= 4 for batch in batcher.get_batches(sources).values())
+
+
+def test_adding_a_source_only_touches_its_batch(tmp_path):
+    batcher = make_batcher(tmp_path, batch_size=8)
+    sources = make_sources(tmp_path, 20)
+
+    # Same number of buckets before and after
+    before = batcher.get_batches(sources)
+    after = batcher.get_batches(sources + [tmp_path / 'src' / 'added.c'])
+
+    changed = [name for name in after if after[name] != before.get(name)]
+
+    assert len(changed) == 1
+    assert tmp_path / 'src' / 'added.c' in after[changed[0]]
+
+
+def test_split_sources(tmp_path):
+    batcher = UnityBuild(tmp_path / 'src', tmp_path / 'unity', 4, exclude=['gen/*'], extension='.c')
+    sources = [tmp_path / 'src' / 'a.c', tmp_path / 'src' / 'gen' / 'b.c', tmp_path / 'src' / 'c.s']
+
+    assert batcher.split_sources(sources) == ([sources[0]], [sources[1], sources[2]])
@@ -0,0 +1,23 @@
+import pytest
+
+from remote.worker import is_allowed_flag
+
+
+@pytest.mark.parametrize('flag', [
+    '-O2', '-Wall', '-Werror=format', '-fPIC', '-fvisibility=hidden',
+    '-fsanitize=address,undefined', '-march=x86-64-v3', '-std=c17',
+    '-DNDEBUG', '-DPATH="a/b"', '-g3', '-pthread',
+])
+def test_allowed_flags(flag):
+    assert is_allowed_flag(flag)
+
+
+@pytest.mark.parametrize('flag', [
+    '-Wa,-adhln=/tmp/out.txt', '-Wp,-MD,/tmp/out.d', '-Wl,-o,/tmp/out',
+    '-Xassembler', '-Xpreprocessor', '-Xlinker',
+    '-fsanitize-ignorelist=/etc/passwd', '-fsanitize-ignorelist=list.txt',
+    '-fprofile-generate=..', '-fplugin=evil.so', '-ffile-prefix-map=/a=/b',
+    '-o', '-B/tmp', '-specs=evil', '@args', '-save-temps', 'extra.c',
+])
+def test_denied_flags(flag):
+    assert not is_allowed_flag(flag)